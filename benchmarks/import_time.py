@@ -0,0 +1,68 @@
+"""
+Бюджет холодного старта точек входа: python -X importtime против лимитов.
+
+Запуск из корня проекта:
+    python benchmarks/import_time.py [--repeat 5] [--scale 1.0]
+
+Код выхода 1, если какой-то сценарий превысил бюджет или подгрузил тяжёлую
+зависимость (selenium, webdriver_manager, openpyxl, bs4, lxml), которая должна
+загружаться только при создании скрапера или экспортёра.
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ('selenium', 'webdriver_manager', 'openpyxl', 'bs4', 'lxml')
+
+# (название, аргументы интерпретатора, бюджет в мс — сумма self-времени всех импортов)
+SCENARIOS = [
+    ('main.py --help', ['main.py', '--help'], 150),
+    ('web_app boot', ['-c', 'import web_app'], 400),
+    ('models + config', ['-c', 'import src.models, src.config, src.dedup'], 100),
+]
+
+
+def measure(args):
+    """Один запуск: (суммарное время импорта в мс, список загруженных модулей)"""
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime'] + args,
+        cwd=ROOT, capture_output=True, text=True, env=dict(os.environ, PYTHONDONTWRITEBYTECODE='1')
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"{' '.join(args)}: код {proc.returncode}\n{proc.stderr[-2000:]}")
+    total_us = 0
+    modules = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|', 2)
+        total_us += int(self_us)
+        modules.append(name.strip())
+    return total_us / 1000, modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5, help='Запусков на сценарий (берётся минимум)')
+    parser.add_argument('--scale', type=float, default=1.0, help='Множитель бюджетов (для медленных машин)')
+    args = parser.parse_args()
+
+    failed = False
+    for title, cmd, budget_ms in SCENARIOS:
+        runs = [measure(cmd) for _ in range(max(1, args.repeat))]
+        best_ms = min(ms for ms, _ in runs)
+        heavy = sorted({m for _, mods in runs for m in mods if m.split('.')[0] in HEAVY_MODULES})
+        limit = budget_ms * args.scale
+        ok = best_ms <= limit and not heavy
+        failed |= not ok
+        print(f"{'OK  ' if ok else 'FAIL'} {title:<18} {best_ms:8.1f} мс (бюджет {limit:.0f} мс)")
+        if heavy:
+            print(f"     тяжёлые модули при старте: {', '.join(heavy)}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,179 @@
+"""
+Нагрузочный прогон пакетного поиска против локальной заглушки 2GIS (benchmarks/mock_2gis.py).
+
+Запуск из корня проекта:
+    python benchmarks/load_test.py --workers 1,2,4 --page-workers 3 --jobs 12 --latency 0.3
+    python benchmarks/load_test.py --driver http --error-rate 0.02 --captcha-rate 0.01
+
+--driver chrome (по умолчанию) — настоящий Chrome через Selenium, как в боевом режиме;
+--driver http — простой HTTP-клиент вместо браузера (проверка конвейера без Chrome).
+Для каждого числа воркеров печатается число компаний в минуту, статистика запросов к заглушке
+и сколько компаний потеряно относительно того, что заглушка отдала бы без ошибок;
+«без тел.» — собранные компании без своего телефона (у каждой фирмы заглушки он есть).
+"""
+import argparse
+import itertools
+import os
+import re
+import sys
+import tempfile
+import time
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# Проверенные на заглушке slug-и не должны попадать в пользовательский кэш городов
+os.environ.setdefault('TWOGIS_CITY_CACHE', os.path.join(tempfile.gettempdir(), '2gis_load_test_cities.json'))
+
+from benchmarks.mock_2gis import MockConfig, start_mock_server  # noqa: E402
+from src.batch import BatchJob, BatchScheduler  # noqa: E402
+from src.cities import CITY_REGISTRY  # noqa: E402
+from src.config import CITY_SLUGS  # noqa: E402
+from src.dedup import FirmIndex  # noqa: E402
+from src.models import extract_firm_id  # noqa: E402
+from src.scraper import TwoGISScraper  # noqa: E402
+
+CATEGORIES = ['Кафе', 'Салоны красоты', 'Автосервисы', 'Стоматологии', 'Фитнес', 'Аптеки']
+
+
+class HttpDriver:
+    """Минимальная замена WebDriver: GET через urllib, page_source — тело ответа"""
+
+    def __init__(self):
+        self.page_source = ''
+        self.current_url = ''
+
+    def get(self, url: str):
+        self.current_url = url
+        try:
+            with urlopen(url, timeout=30) as resp:
+                self.page_source = resp.read().decode('utf-8')
+        except HTTPError as e:
+            self.page_source = e.read().decode('utf-8', 'replace')
+
+    def execute_script(self, script: str):
+        return 'complete'
+
+    def implicitly_wait(self, seconds):
+        pass
+
+    def quit(self):
+        pass
+
+
+def make_scraper_factory(args, base_url: str):
+    class BenchScraper(TwoGISScraper):
+        PAGE_DELAY = args.page_delay
+        RENDER_WAIT = args.render_wait
+        FIRM_RENDER_WAIT = args.render_wait
+        PHONE_DELAY = args.page_delay
+        CAPTCHA_BACKOFF = args.captcha_backoff
+        ERROR_BACKOFF = args.captcha_backoff
+
+        if args.driver == 'http':
+            def _create_driver(self):
+                return HttpDriver()
+
+            def _wait_ready(self, driver, timeout):
+                pass
+
+    return lambda: BenchScraper(headless=True, page_workers=args.page_workers, base_url=base_url)
+
+
+def build_jobs(count: int, max_results):
+    cities = list(CITY_SLUGS.get('Россия', {}))
+    pairs = itertools.islice(itertools.product(CATEGORIES, cities), count)
+    return [BatchJob(city=city, category=category, max_results=max_results) for category, city in pairs]
+
+
+def expected_companies(jobs, data) -> int:
+    """
+    Сколько уникальных фирм заглушка отдаёт по заданиям без ошибок и капч.
+    С max_results — оценка: первые max_results позиций выдачи каждого задания.
+    """
+    firms = set()
+    for job in jobs:
+        slug = CITY_REGISTRY.slug(job.city, job.country)
+        category = (job.category or 'все').lower()
+        total = data.total(slug, category)
+        if job.max_results:
+            total = min(total, job.max_results)
+        firms.update(data.firm_id(slug, category, i) for i in range(total))
+    return len(firms)
+
+
+def lost_phones(companies, data) -> int:
+    """Сколько собранных компаний остались без телефона, который заглушка отдаёт на странице фирмы"""
+    lost = 0
+    for company in companies:
+        firm_id = extract_firm_id(company.url)
+        if not firm_id:
+            continue
+        expected = re.sub(r'\D', '', data.firm(None, int(firm_id))['phone'])
+        if expected not in re.sub(r'\D', '', company.phone or ''):
+            lost += 1
+    return lost
+
+
+def run_once(args, workers: int, base_url: str, server) -> dict:
+    jobs = build_jobs(args.jobs, args.max_results)
+    requests_before = server.requests
+    collected = []
+    started = time.perf_counter()
+    scheduler = BatchScheduler(jobs, workers=workers, page_workers=args.page_workers,
+                               scraper_factory=make_scraper_factory(args, base_url), firm_index=FirmIndex())
+    stats = scheduler.run(collected.append)
+    elapsed = time.perf_counter() - started
+    expected = expected_companies(jobs, server.data)
+    return {
+        'workers': workers,
+        'elapsed': elapsed,
+        'companies': stats.companies,
+        'per_minute': stats.companies / elapsed * 60 if elapsed else 0.0,
+        'jobs_failed': stats.jobs_failed,
+        'lost': max(0, expected - stats.companies),
+        'lost_phones': lost_phones(collected, server.data),
+        'duplicates': stats.duplicates,
+        'requests': server.requests - requests_before,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', default='1,2,4', help='Числа воркеров через запятую')
+    parser.add_argument('--page-workers', type=int, default=3, help='Параллельных страниц на воркер')
+    parser.add_argument('--jobs', type=int, default=12, help='Заданий (город × категория) в пакете')
+    parser.add_argument('--max-results', type=int, help='Лимит компаний на задание')
+    parser.add_argument('--driver', choices=['chrome', 'http'], default='chrome')
+    parser.add_argument('--latency', type=float, default=0.2, help='Задержка ответа заглушки, сек')
+    parser.add_argument('--jitter', type=float, default=0.1, help='Случайная добавка к задержке, сек')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Доля ответов 500')
+    parser.add_argument('--captcha-rate', type=float, default=0.0, help='Доля страниц с капчей')
+    parser.add_argument('--results', type=int, help='Результатов на поиск (по умолчанию 20..400)')
+    parser.add_argument('--render-wait', type=float, default=0.0, help='Пауза на отрисовку страницы, сек')
+    parser.add_argument('--page-delay', type=float, default=0.0, help='Пауза между страницами, сек')
+    parser.add_argument('--captcha-backoff', type=float, default=0.5, help='Пауза после капчи или ошибки 500, сек')
+    args = parser.parse_args()
+
+    server = start_mock_server(config=MockConfig(
+        latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+        captcha_rate=args.captcha_rate, results=args.results,
+    ))
+    print(f"Заглушка: {server.base_url}, драйвер: {args.driver}, заданий: {args.jobs}, "
+          f"страниц параллельно: {args.page_workers}")
+    print(f"{'воркеры':>8} {'время, с':>9} {'компаний':>9} {'в минуту':>9} {'запросов':>9} {'дубли':>6} "
+          f"{'ошибки':>7} {'потеряно':>9} {'без тел.':>9}")
+    try:
+        for workers in [int(w) for w in args.workers.split(',') if w.strip()]:
+            r = run_once(args, workers, server.base_url, server)
+            print(f"{r['workers']:>8} {r['elapsed']:>9.1f} {r['companies']:>9} {r['per_minute']:>9.0f} "
+                  f"{r['requests']:>9} {r['duplicates']:>6} {r['jobs_failed']:>7} {r['lost']:>9} {r['lost_phones']:>9}")
+    finally:
+        server.shutdown()
+        server.server_close()
+    print(f"Всего запросов: {server.requests}, ошибок 500: {server.errors}, капч: {server.captchas}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,225 @@
+"""
+Локальный сервер-заглушка 2GIS для нагрузочных прогонов и проверки скрапера без сети.
+
+Отдаёт синтетические страницы выдачи (/<city>/search/<category>[/page/<n>]) со счётчиком
+результатов, пагинацией, карточками (/firm/<id>, tel:, адрес, описание) и страницы
+фирм (/<city>/firm/<id>). Задержка, доля ошибок 500 и доля страниц с капчей настраиваются.
+
+Запуск:
+    python benchmarks/mock_2gis.py --port 8099 --latency 0.2 --error-rate 0.01
+    TWOGIS_BASE_URL=http://127.0.0.1:8099 python main.py search -c Москва -cat Кафе
+"""
+import argparse
+import hashlib
+import html
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Tuple
+from urllib.parse import unquote
+
+PER_PAGE = 12
+
+_STREETS = ['Ленина', 'Мира', 'Гагарина', 'Советская', 'Пушкина', 'Абая', 'Навои', 'Садовая']
+_KINDS = ['улица', 'проспект', 'бульвар', 'переулок']
+_DESCRIPTIONS = [
+    'Компания предлагает полный спектр услуг для бизнеса и частных клиентов',
+    'Работаем без выходных, бесплатная парковка и удобный подъезд для клиентов',
+    'Салон с многолетней историей, опытные мастера и современное оборудование',
+    'Магазин широкого ассортимента товаров, доставка по городу в день заказа',
+]
+
+
+@dataclass
+class MockConfig:
+    latency: float = 0.0          # базовая задержка ответа, сек
+    jitter: float = 0.0           # случайная добавка к задержке, сек
+    error_rate: float = 0.0       # доля ответов 500
+    captcha_rate: float = 0.0     # доля страниц с капчей
+    results: Optional[int] = None # фиксированное число результатов на поиск (иначе — по хешу запроса)
+    pool_size: int = 2000         # фирм в городе (категории пересекаются внутри пула)
+    phone_rate: float = 0.7       # доля карточек с телефоном прямо в выдаче
+    seed: int = 0
+
+
+def _h(*parts) -> int:
+    return int.from_bytes(hashlib.blake2b('|'.join(map(str, parts)).encode(), digest_size=8).digest(), 'big')
+
+
+class MockData:
+    """Детерминированные синтетические данные: одинаковый запрос — одинаковая страница"""
+
+    def __init__(self, config: MockConfig):
+        self.config = config
+
+    def total(self, city: str, category: str) -> int:
+        if self.config.results is not None:
+            return self.config.results
+        return 20 + _h(self.config.seed, 'total', city, category) % 380
+
+    def firm_id(self, city: str, category: str, index: int) -> int:
+        slot = (_h(self.config.seed, 'cat', category) + index * 7919) % self.config.pool_size
+        return 70000000000000 + (_h(city) % 100000) * 100000 + slot
+
+    def firm(self, city: str, firm_id: int) -> dict:
+        h = _h(self.config.seed, 'firm', firm_id)
+        return {
+            'id': firm_id,
+            'name': f"Фирма {firm_id % 100000}",
+            'rating': round(3 + (h % 21) / 10, 1),
+            'votes': 1 + h % 500,
+            'address': f"{_KINDS[h % len(_KINDS)]} {_STREETS[(h >> 4) % len(_STREETS)]}, д. {1 + (h >> 8) % 150}",
+            'description': _DESCRIPTIONS[(h >> 12) % len(_DESCRIPTIONS)],
+            'phone': f"+7 ({900 + h % 99}) {100 + (h >> 16) % 900}-{10 + (h >> 24) % 90}-{10 + (h >> 32) % 90}",
+            'phone_in_list': ((h >> 40) % 1000) / 1000 < self.config.phone_rate,
+        }
+
+    def search_page(self, city: str, category: str, page: int) -> Optional[str]:
+        total = self.total(city, category)
+        pages = max(1, -(-total // PER_PAGE))
+        if page > pages:
+            return None
+        cards = []
+        for i in range((page - 1) * PER_PAGE, min(page * PER_PAGE, total)):
+            f = self.firm(city, self.firm_id(city, category, i))
+            tel = f'<a href="tel:{f["phone"]}">{html.escape(f["phone"])}</a>' if f['phone_in_list'] else ''
+            cards.append(f'''
+<article class="card">
+  <div class="card__head"><a href="/{city}/firm/{f["id"]}?m=list">{html.escape(f["name"])}</a>
+    <div class="card__contacts">{tel}</div></div>
+  <div class="card__rating"><span>{f["rating"]}</span> <span>{f["votes"]} оценок</span></div>
+  <div class="card__address"><span class="address">{html.escape(f["address"])}</span></div>
+  <div class="card__snippet"><div class="description">{html.escape(f["description"])}</div></div>
+</article>''')
+        nav = ''.join(
+            f'<a href="/{city}/search/{category}/page/{p}">{p}</a>'
+            for p in range(max(1, page - 2), min(pages, page + 3) + 1) if p != page
+        )
+        return (f'<!DOCTYPE html><html><head><title>{html.escape(category)} — 2GIS mock</title></head><body>'
+                f'<header><h1>{html.escape(category)}</h1><div class="count">Места {total}</div></header>'
+                f'<main class="list">{"".join(cards)}</main><nav class="pagination">{nav}</nav></body></html>')
+
+    def firm_page(self, city: str, firm_id: int) -> str:
+        f = self.firm(city, firm_id)
+        return (f'<!DOCTYPE html><html><head><title>{html.escape(f["name"])} — 2GIS mock</title></head><body>'
+                f'<h1>{html.escape(f["name"])}</h1><div class="address">{html.escape(f["address"])}</div>'
+                f'<div class="contacts"><a href="tel:{f["phone"]}">{html.escape(f["phone"])}</a></div></body></html>')
+
+
+_SEARCH_RE = re.compile(r'^/([^/]+)/search/([^/?]+)(?:/page/(\d+))?/?$')
+_SEARCH_ALL_RE = re.compile(r'^/([^/]+)/search/?(?:/page/(\d+))?/?$')
+_FIRM_RE = re.compile(r'^/([^/]+)/firm/(\d+)')
+
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], config: MockConfig):
+        super().__init__(address, MockHandler)
+        self.config = config
+        self.data = MockData(config)
+        self.rng = random.Random(config.seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.search_pages = 0
+        self.firm_pages = 0
+        self.errors = 0
+        self.captchas = 0
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def roll(self, rate: float) -> bool:
+        with self.lock:
+            return rate > 0 and self.rng.random() < rate
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    server: MockServer
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, code: int, body: str):
+        data = body.encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        srv = self.server
+        cfg = srv.config
+        with srv.lock:
+            srv.requests += 1
+        delay = cfg.latency + (srv.rng.random() * cfg.jitter if cfg.jitter else 0)
+        if delay:
+            time.sleep(delay)
+        if srv.roll(cfg.error_rate):
+            with srv.lock:
+                srv.errors += 1
+            return self._send(500, '<html><head><title>Ошибка 500</title></head><body>Ошибка сервера</body></html>')
+        if srv.roll(cfg.captcha_rate):
+            with srv.lock:
+                srv.captchas += 1
+            return self._send(200, '<html><head><title>Captcha</title></head><body>Подтвердите, что вы не робот</body></html>')
+
+        path = unquote(self.path.split('?')[0])
+        m = _SEARCH_RE.match(path) or _SEARCH_ALL_RE.match(path)
+        if m:
+            groups = m.groups()
+            city = groups[0]
+            category, page = (groups[1], groups[2]) if len(groups) == 3 else ('все', groups[1])
+            body = srv.data.search_page(city, category, int(page or 1))
+            with srv.lock:
+                srv.search_pages += 1
+            if body is None:
+                return self._send(200, '<html><head><title>Ничего не найдено</title></head><body></body></html>')
+            return self._send(200, body)
+        m = _FIRM_RE.match(path)
+        if m:
+            with srv.lock:
+                srv.firm_pages += 1
+            return self._send(200, srv.data.firm_page(m.group(1), int(m.group(2))))
+        return self._send(404, '<html><head><title>Ошибка 404</title></head><body>Страница не найдена</body></html>')
+
+
+def start_mock_server(host: str = '127.0.0.1', port: int = 0, config: Optional[MockConfig] = None) -> MockServer:
+    """Запустить сервер в фоновом потоке (port=0 — любой свободный). Остановка: server.shutdown()."""
+    server = MockServer((host, port), config or MockConfig())
+    threading.Thread(target=server.serve_forever, name='mock-2gis', daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Локальный сервер-заглушка 2GIS')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--latency', type=float, default=0.0, help='Задержка ответа, сек')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Случайная добавка к задержке, сек')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Доля ответов 500')
+    parser.add_argument('--captcha-rate', type=float, default=0.0, help='Доля страниц с капчей')
+    parser.add_argument('--results', type=int, help='Результатов на каждый поиск (по умолчанию 20..400)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    config = MockConfig(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                        captcha_rate=args.captcha_rate, results=args.results, seed=args.seed)
+    server = MockServer((args.host, args.port), config)
+    print(f"Заглушка 2GIS: {server.base_url} (Ctrl+C — остановка)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,266 @@
+"""
+Сверка и замер разбора карточек: TwoGISScraper._extract_address_and_info против эталонной
+(прежней) реализации legacy_extract_address_and_info на синтетическом корпусе карточек,
+и разбор страниц выдачи без кэша карточек / с холодным / с прогретым кэшем.
+
+Запуск из корня проекта:
+    python benchmarks/parse_cards.py [--cards 3000] [--repeat 3] [--seed 1]
+
+Корпус: выдача заглушки (benchmarks/mock_2gis.py) плюс карточки с разной разметкой —
+адрес в классе address / в простом span / внутри сниппета вместе с описанием / только
+в тексте карточки, описание в description / snippet / без класса, шум (рейтинг, часы работы),
+встроенные script / style / template.
+Код выхода 1, если результат хотя бы одной карточки расходится с эталоном.
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.mock_2gis import MockConfig, MockData  # noqa: E402
+from src.card_cache import CardCache  # noqa: E402
+from src.scraper import TwoGISScraper  # noqa: E402
+
+
+def legacy_extract_address_and_info(self, card, card_text: str, name: str) -> tuple:
+    """Прежняя реализация _extract_address_and_info (до однопроходного разбора) — эталон вывода"""
+    address = None
+    info = None
+
+    # 1. Адрес: селекторы
+    for sel in ['[data-testid="address"]', '.address', '[class*="address"]', '[class*="Address"]', 'a[href^="geo:"]']:
+        el = card.select_one(sel)
+        if el:
+            t = el.get_text(strip=True)
+            if 5 < len(t) < 250 and self._ADDR_RE.search(t):
+                address = t[:250]
+                break
+
+    # 2. Адрес: элементы с адресоподобным текстом (без описания)
+    if not address:
+        for el in card.find_all(['span', 'div', 'p', 'a']):
+            t = el.get_text(strip=True)
+            if 8 < len(t) < 220 and self._ADDR_RE.search(t) and not re.search(self._DESC_KEYWORDS, t, re.I):
+                address = t[:250]
+                break
+
+    # 3. Адрес: regex по card_text (адрес в начале или с городом)
+    if not address:
+        for pat in [
+            rf'({self._ADDR_KEYWORDS}[^.]{{5,150}})',
+            r'([^,]{5,120}(?:улица|ул\.|пр\.|бульвар|переулок|площадь|проспект|шоссе)[^,]{0,80})',
+        ]:
+            m = re.search(pat, card_text, re.I)
+            if m:
+                address = m.group(1).strip()[:250]
+                break
+
+    # 4. Info: только описание (без адреса)
+    for sel in ['[data-testid="description"]', '.description', '[class*="description"]', '[class*="snippet"]', '[class*="Snippet"]']:
+        el = card.select_one(sel)
+        if el:
+            txt = el.get_text(strip=True)
+            if 20 < len(txt) < 800 and txt != name and not re.match(r'^\d+[.,]\d+', txt):
+                if not self._ADDR_RE.search(txt):
+                    info = txt[:500]
+                    break
+                # Блок содержит адрес (и возможно описание)
+                if not address and 8 < len(txt) < 250:
+                    address = txt[:250]
+                split_m = re.search(rf'\.\s*(?:{self._DESC_KEYWORDS})', txt, re.I)
+                if split_m:
+                    addr_part = txt[:split_m.start()].strip()
+                    desc_part = txt[split_m.start():].lstrip('. ')
+                    if self._ADDR_RE.search(addr_part) and len(addr_part) < 220:
+                        if not address:
+                            address = addr_part[:250]
+                        if len(desc_part) >= 15:
+                            info = desc_part[:500]
+                break
+
+    # 5. Info: fallback — элементы без адреса
+    if not info:
+        for el in card.find_all(['span', 'div', 'p']):
+            t = el.get_text(strip=True)
+            if 25 < len(t) < 600 and t != name and t != address:
+                if not re.match(r'^\d+', t) and 'оценок' not in t.lower() and not self._ADDR_RE.search(t):
+                    info = t[:500]
+                    break
+
+    # 6. Финальная очистка: адрес в info — переносим в address и удаляем из info
+    if info and not address:
+        m = re.search(rf'({self._ADDR_KEYWORDS}[^.]{{5,200}})', info, re.I)
+        if m:
+            address = m.group(1).strip()[:250]
+            info = re.sub(re.escape(address), '', info, count=1).strip()
+    if info and address and address in info:
+        info = info.replace(address, '', 1).strip()
+
+    if info:
+        for sep in (', ', '. ', ' — ', ' – ', ': '):
+            while info.startswith(sep):
+                info = info[len(sep):].strip()
+            while info.endswith(sep):
+                info = info[:-len(sep)].strip()
+    if not info or len(info) < 15:
+        info = None
+
+    return (address, info)
+
+
+class NoCardCache(CardCache):
+    """Кэш, который никогда не находит карточку — разбор каждый раз полностью"""
+
+    def get(self, key: bytes):
+        self.stats.misses += 1
+        return None
+
+
+class PageParser(TwoGISScraper):
+    """Скрапер без браузера — только разбор страниц"""
+
+    def __init__(self, card_cache: CardCache):
+        self.card_cache = card_cache
+        self._owns_card_cache = False
+
+
+class CardRecorder(PageParser):
+    """_parse_search_page сохраняет аргументы разбора каждой карточки"""
+
+    def __init__(self):
+        super().__init__(NoCardCache())
+        self.calls = []
+
+    def _extract_address_and_info(self, card, card_text: str, name: str) -> tuple:
+        self.calls.append((card, card_text, name))
+        return None, None
+
+
+_ADDRESSES = ['ул. Ленина, 5', 'улица Мира, 12/1', 'проспект Абая, д. 150, корп. 2', 'Садовая, 7, стр. 3',
+              'м. Киевская, ТЦ Европейский', 'г. Алматы, мкр. Самал-2, 58', 'бульвар Гагарина 3', 'Навои, 30']
+_DESCRIPTIONS = ['Кафе европейской кухни, завтраки весь день и бизнес-ланчи по будням',
+                 'Компания оказывает услуги по ремонту техники с гарантией до года',
+                 'Салон красоты полного цикла, маникюр, стрижки и окрашивание волос',
+                 'Свежая выпечка и кофе с собой, есть веранда на летний сезон',
+                 'Мастерская по изготовлению ключей и ремонту обуви у метро',
+                 'Работаем круглосуточно. Доставка по городу бесплатно от 1000 рублей']
+_NOISE = ['Открыто до 22:00', 'Круглосуточно', '4.8', '1 234 оценок', 'Филиалы 12', 'Реклама',
+          'Закроется через 15 минут', 'Есть доставка', 'Оплата картой']
+
+
+def _random_card(rng: random.Random, firm_id: int) -> str:
+    name = f"{rng.choice(['Кафе', 'Салон', 'Сервис', 'Студия', 'Магазин'])} «{rng.choice(['Лето', 'Полёт', 'Огонёк', 'Ракета'])} {firm_id % 1000}»"
+    address = rng.choice(_ADDRESSES)
+    desc = rng.choice(_DESCRIPTIONS)
+    parts = [f'<div class="{rng.choice(["_1h3cgic", "card__head", ""])}">'
+             f'<a href="/moscow/firm/{firm_id}"><span>{name}</span></a></div>']
+    rating = f'<div><span>{rng.randint(30, 50) / 10}</span><span>{rng.randint(1, 900)} оценок</span></div>'
+    layout = rng.randrange(7)
+    if layout == 0:
+        body = f'<div class="address"><span>{address}</span></div><div class="description">{desc}</div>'
+    elif layout == 1:
+        body = f'<span class="_2lcm958">{address}</span><div class="_snippetText">{desc}</div>'
+    elif layout == 2:
+        body = f'<div class="_1p8iqzw">{address}. {desc}</div>'
+    elif layout == 3:
+        body = f'<div class="cardSnippet">{address}. {desc}</div>'
+    elif layout == 4:
+        body = f'<a href="geo:55.7,37.6">{address}</a><p>{desc}</p>'
+    elif layout == 5:
+        body = f'<div data-testid="address">{address}</div><div data-testid="description">{desc}</div>'
+    else:
+        body = f'<div>{desc} {address}</div>'
+    noise = ''.join(f'<span class="_noise">{n}</span>' for n in rng.sample(_NOISE, rng.randint(0, 3)))
+    phone = '<a href="tel:+74951234567">+7 (495) 123-45-67</a>' if rng.random() < 0.5 else ''
+    # Встроенные скрипты и стили: у этих тегов свой тип строк, get_text() родителя их пропускает
+    inline = rng.choice(['', '', '<script>window.__card = {"id": 1, "title": "Кафе на улице Ленина"}</script>',
+                         '<style>.c{color:red}</style>', '<template><span>ул. Шаблонная, 1</span></template>'])
+    order = [rating, body, noise, phone, inline]
+    rng.shuffle(order)
+    return f'<article>{"".join(parts)}<div>{"".join(order)}</div></article>'
+
+
+def build_corpus(cards: int, seed: int) -> list:
+    """Страницы выдачи: половина — заглушка 2GIS, половина — карточки со случайной разметкой"""
+    rng = random.Random(seed)
+    pages = []
+    data = MockData(MockConfig(seed=seed))
+    mock_pages = 0
+    while mock_pages * 12 < cards // 2:
+        pages.append(data.search_page('moscow', f'категория-{mock_pages // 10}', mock_pages % 10 + 1) or '')
+        mock_pages += 1
+    firm_id = 70000000000000
+    while (len(pages) - mock_pages) * 12 < cards - cards // 2:
+        body = ''.join(_random_card(rng, firm_id + i) for i in range(12))
+        firm_id += 12
+        pages.append(f'<!DOCTYPE html><html><head><title>Поиск</title></head><body>'
+                     f'<h1>Места {rng.randint(100, 900)}</h1><main>{body}</main></body></html>')
+    return pages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--cards', type=int, default=3000, help='Карточек в корпусе')
+    parser.add_argument('--repeat', type=int, default=3, help='Повторов замера (берётся минимум)')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    pages = build_corpus(args.cards, args.seed)
+    recorder = CardRecorder()
+    for html in pages:
+        recorder._parse_search_page(html, 'https://2gis.ru')
+    calls = recorder.calls
+    scraper = CardRecorder()  # без браузера; методы разбора — как у TwoGISScraper
+    current = TwoGISScraper._extract_address_and_info
+
+    mismatches = 0
+    for card, card_text, name in calls:
+        expected = legacy_extract_address_and_info(scraper, card, card_text, name)
+        actual = current(scraper, card, card_text, name)
+        if expected != actual:
+            mismatches += 1
+            if mismatches <= 5:
+                print(f"Расхождение для «{name}»:\n  эталон: {expected}\n  сейчас: {actual}")
+
+    def measure(fn) -> float:
+        best = float('inf')
+        for _ in range(max(1, args.repeat)):
+            started = time.perf_counter()
+            for card, card_text, name in calls:
+                fn(scraper, card, card_text, name)
+            best = min(best, time.perf_counter() - started)
+        return best / max(1, len(calls)) * 1e6
+
+    legacy_us = measure(legacy_extract_address_and_info)
+    current_us = measure(current)
+    print(f"Карточек: {len(calls)}, расхождений: {mismatches}")
+    print(f"Эталон:  {legacy_us:8.1f} мкс/карточка")
+    print(f"Сейчас:  {current_us:8.1f} мкс/карточка (ускорение x{legacy_us / current_us:.1f})")
+
+    # Разбор страниц целиком: повторный обход тех же страниц (соседние категории, повторный запуск)
+    def parse_all(parser) -> tuple:
+        started = time.perf_counter()
+        parsed = [parser._parse_search_page(html, 'https://2gis.ru') for html in pages]
+        return (time.perf_counter() - started) / max(1, len(calls)) * 1e6, parsed
+
+    baseline_us, expected_pages = parse_all(PageParser(NoCardCache()))
+    cache = CardCache()
+    cold_us, _ = parse_all(PageParser(cache))
+    warm_us, cached_pages = parse_all(PageParser(cache))
+    if cached_pages != expected_pages:
+        mismatches += 1
+        print("Расхождение: страницы, разобранные через кэш, отличаются от разбора без кэша")
+    print(f"Страницы без кэша:        {baseline_us:8.1f} мкс/карточка")
+    print(f"С кэшем, первый проход:   {cold_us:8.1f} мкс/карточка")
+    print(f"С кэшем, повторный проход:{warm_us:8.1f} мкс/карточка "
+          f"(доля попаданий {cache.stats.hit_rate:.0%}, ускорение x{baseline_us / warm_us:.1f})")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -4,3 +4,24 @@
 """
 
 __version__ = "1.0.0"
+
+# Тяжёлые зависимости (selenium, webdriver_manager, openpyxl) загружаются только
+# при первом создании скрапера или экспортёра — импорт пакета остаётся быстрым.
+
+
+def create_scraper(**kwargs):
+    """Создать TwoGISScraper (аргументы — как у конструктора)"""
+    from .scraper import TwoGISScraper
+    return TwoGISScraper(**kwargs)
+
+
+def create_exporter():
+    """Создать ExcelExporter"""
+    from .excel_exporter import ExcelExporter
+    return ExcelExporter()
+
+
+def create_stream_writer(filename: str):
+    """Создать ExcelStreamWriter для потоковой записи в файл"""
+    from .excel_exporter import ExcelStreamWriter
+    return ExcelStreamWriter(filename)
@@ -0,0 +1,175 @@
+"""
+Пакетный запуск поиска: много пар (город, категория) на общем пуле скраперов.
+Задания берутся из CSV или YAML файла, результаты дедуплицируются по ID фирмы
+и потоково пишутся в один выходной файл.
+"""
+import csv
+import itertools
+import logging
+import queue
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, List, Optional
+
+from .card_cache import CardCache
+from .dedup import FirmIndex
+from .models import Company
+from .snapshot import RefreshDiff, Snapshot
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class BatchJob:
+    """Одно задание пакета: город + категория"""
+    city: str
+    country: str = 'Россия'
+    category: Optional[str] = None
+    max_results: Optional[int] = None
+    priority: int = 0
+
+
+@dataclass
+class BatchStats:
+    jobs_total: int = 0
+    jobs_done: int = 0
+    jobs_failed: int = 0
+    companies: int = 0
+    duplicates: int = 0
+
+
+def _job_from_row(row: dict) -> Optional[BatchJob]:
+    row = {str(k).strip().lower(): v for k, v in row.items() if k is not None}
+    city = str(row.get('city') or '').strip()
+    if not city:
+        return None
+    max_results = str(row.get('max_results') or '').strip()
+    priority = str(row.get('priority') or '').strip()
+    return BatchJob(
+        city=city,
+        country=str(row.get('country') or '').strip() or 'Россия',
+        category=str(row.get('category') or '').strip() or None,
+        max_results=int(max_results) if max_results else None,
+        priority=int(priority) if priority else 0,
+    )
+
+
+def load_jobs(path: str) -> List[BatchJob]:
+    """
+    Чтение файла заданий. CSV: колонки country, city, category, max_results[, priority].
+    YAML: список словарей с теми же ключами (или {'jobs': [...]}).
+    """
+    filepath = Path(path)
+    if filepath.suffix.lower() in ('.yaml', '.yml'):
+        try:
+            import yaml
+        except ImportError:
+            raise ValueError("Для YAML файлов установите PyYAML: pip install pyyaml")
+        with open(filepath, encoding='utf-8') as f:
+            data = yaml.safe_load(f) or []
+        if isinstance(data, dict):
+            data = data.get('jobs') or []
+        rows = data
+    else:
+        with open(filepath, encoding='utf-8-sig', newline='') as f:
+            rows = list(csv.DictReader(f))
+    jobs = [job for job in (_job_from_row(r) for r in rows if isinstance(r, dict)) if job]
+    logger.info(f"Загружено заданий: {len(jobs)} из {filepath}")
+    return jobs
+
+
+class BatchScheduler:
+    """
+    Планировщик заданий на общем пуле скраперов. Каждый воркер держит один браузер
+    на весь пакет; задания с большим priority выполняются первыми.
+    snapshot — снимок прошлого запуска (режим обновления); разница копится в self.diff.
+    card_cache — общий для воркеров кэш разобранных карточек.
+    """
+
+    def __init__(self, jobs: List[BatchJob], workers: int = 2, headless: bool = True,
+                 page_workers: int = 1, scraper_factory: Optional[Callable] = None,
+                 firm_index: Optional[FirmIndex] = None, snapshot: Optional[Snapshot] = None,
+                 card_cache: Optional[CardCache] = None):
+        self.jobs = list(jobs)
+        self.workers = max(1, min(workers, len(self.jobs) or 1))
+        self.headless = headless
+        self.page_workers = page_workers
+        self.scraper_factory = scraper_factory or self._default_scraper_factory
+        self.stats = BatchStats(jobs_total=len(self.jobs))
+        self.firm_index = firm_index if firm_index is not None else FirmIndex()
+        self.snapshot = snapshot
+        self.card_cache = card_cache
+        self.diff = RefreshDiff()
+        self._lock = threading.Lock()
+
+    def _default_scraper_factory(self):
+        from . import create_scraper
+        return create_scraper(headless=self.headless, page_workers=self.page_workers, card_cache=self.card_cache)
+
+    def run(self, sink: Callable[[Company], None], progress_callback=None) -> BatchStats:
+        """
+        Выполнение всех заданий. sink вызывается для каждой новой компании
+        (последовательно, из-под общей блокировки).
+        """
+        tasks = queue.PriorityQueue()
+        counter = itertools.count()
+        for job in self.jobs:
+            tasks.put((-job.priority, next(counter), job))
+
+        def worker(worker_idx: int):
+            try:
+                scraper = self.scraper_factory()
+            except Exception as e:
+                logger.error(f"Воркер {worker_idx}: не удалось запустить браузер: {e}")
+                return
+            try:
+                while True:
+                    try:
+                        _, _, job = tasks.get_nowait()
+                    except queue.Empty:
+                        return
+                    label = f"{job.country} / {job.city} / {job.category or 'все'}"
+                    refresh = self.snapshot.session(job.city, job.category, job.country) if self.snapshot else None
+                    try:
+                        companies = scraper.search_companies(
+                            city=job.city,
+                            category=job.category,
+                            max_results=job.max_results,
+                            country=job.country,
+                            firm_index=self.firm_index,
+                            refresh=refresh
+                        )
+                        diff = refresh.finish() if refresh is not None else None
+                    except Exception as e:
+                        logger.error(f"Задание {label} завершилось ошибкой: {e}", exc_info=True)
+                        with self._lock:
+                            self.stats.jobs_failed += 1
+                        continue
+                    with self._lock:
+                        for c in companies:
+                            sink(c)
+                        if diff is not None:
+                            self.diff.extend(diff)
+                        self.stats.companies += len(companies)
+                        self.stats.duplicates = self.firm_index.duplicates
+                        self.stats.jobs_done += 1
+                        done = self.stats.jobs_done + self.stats.jobs_failed
+                        logger.info(f"[{done}/{self.stats.jobs_total}] {label}: {len(companies)} новых компаний")
+                        if progress_callback:
+                            progress_callback(done, self.stats.jobs_total, label)
+            finally:
+                scraper.close()
+
+        threads = [
+            threading.Thread(target=worker, args=(i,), name=f'2gis-batch-{i}', daemon=True)
+            for i in range(self.workers)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        # Задания, до которых не дошла очередь (например, не запустился ни один браузер)
+        self.stats.jobs_failed += tasks.qsize()
+        return self.stats
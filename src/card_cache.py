@@ -0,0 +1,129 @@
+"""
+Кэш разобранных карточек выдачи. Одни и те же фирмы встречаются на страницах соседних
+категорий и в повторных запусках; по хешу HTML карточки и ссылки на фирму возвращаются
+ранее извлечённые поля Company без повторного разбора.
+Уровни: LRU в памяти и, по желанию, SQLite файл между запусками.
+"""
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+from .config import DEFAULT_CARD_CACHE_SIZE
+from .models import Company
+
+logger = logging.getLogger(__name__)
+
+# Поля, которые берутся из карточки (url и city задаются при разборе и сборе)
+_FIELDS = ('name', 'phone', 'address', 'rating', 'voters_count', 'info')
+
+
+@dataclass
+class CardCacheStats:
+    hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.disk_hits + self.misses
+        return (self.hits + self.disk_hits) / total if total else 0.0
+
+
+class CardCache:
+    """
+    capacity — карточек в памяти (вытесняются давно не использованные).
+    path — файл постоянного уровня (SQLite); None — только память.
+    """
+
+    FLUSH_EVERY = 200
+
+    def __init__(self, capacity: int = DEFAULT_CARD_CACHE_SIZE, path: Optional[str] = None):
+        self.capacity = max(1, capacity)
+        self.path = path
+        self.stats = CardCacheStats()
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._pending = []
+        self._conn = None
+        if path:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('CREATE TABLE IF NOT EXISTS cards (key BLOB PRIMARY KEY, data TEXT NOT NULL)')
+            self._conn.commit()
+
+    @staticmethod
+    def key(href: str, card) -> bytes:
+        """Ключ: ссылка на фирму + HTML карточки (без экранирования — быстрее, ключу не важно)"""
+        h = hashlib.blake2b(digest_size=16)
+        h.update(href.encode('utf-8'))
+        h.update(b'\x00')
+        h.update(card.decode(formatter=None).encode('utf-8'))
+        return h.digest()
+
+    def _remember(self, key: bytes, fields: tuple):
+        self._memory[key] = fields
+        self._memory.move_to_end(key)
+        if len(self._memory) > self.capacity:
+            self._memory.popitem(last=False)
+
+    def get(self, key: bytes) -> Optional[dict]:
+        """Поля Company по ключу или None"""
+        with self._lock:
+            fields = self._memory.get(key)
+            if fields is not None:
+                self._memory.move_to_end(key)
+                self.stats.hits += 1
+                return dict(zip(_FIELDS, fields))
+            if self._conn is not None:
+                row = self._conn.execute('SELECT data FROM cards WHERE key = ?', (key,)).fetchone()
+                if row:
+                    fields = tuple(json.loads(row[0]))
+                    self._remember(key, fields)
+                    self.stats.disk_hits += 1
+                    return dict(zip(_FIELDS, fields))
+            self.stats.misses += 1
+            return None
+
+    def put(self, key: bytes, company: Company):
+        fields = tuple(getattr(company, f) for f in _FIELDS)
+        with self._lock:
+            self._remember(key, fields)
+            if self._conn is not None:
+                self._pending.append((key, json.dumps(fields, ensure_ascii=False)))
+                if len(self._pending) >= self.FLUSH_EVERY:
+                    self._flush()
+
+    def _flush(self):
+        if self._pending and self._conn is not None:
+            self._conn.executemany('INSERT OR REPLACE INTO cards (key, data) VALUES (?, ?)', self._pending)
+            self._conn.commit()
+        self._pending = []
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def __len__(self) -> int:
+        return len(self._memory)
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+        st = self.stats
+        if st.hits or st.disk_hits or st.misses:
+            logger.info(f"Кэш карточек: попаданий {st.hits + st.disk_hits} (с диска {st.disk_hits}), "
+                        f"промахов {st.misses}, доля попаданий {st.hit_rate:.0%}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
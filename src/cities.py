@@ -0,0 +1,192 @@
+"""
+Реестр городов: slug-и 2GIS, оценка объёма бизнеса и кэш slug-ов, проверенных при поиске.
+Собирается один раз при импорте модуля (CITY_REGISTRY).
+"""
+import json
+import logging
+import os
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from .config import CITIES_BY_COUNTRY, CITY_SLUGS, CITY_VOLUME, DEFAULT_CITY_VOLUME
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_COUNTRY = 'Россия'
+CACHE_PATH = Path(os.environ.get(
+    'TWOGIS_CITY_CACHE',
+    Path.home() / '.2gis-lead-generator' / 'city_slugs.json'
+))
+
+_TRANSLIT = {
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'yo',
+    'ж': 'zh', 'з': 'z', 'и': 'i', 'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm',
+    'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u',
+    'ф': 'f', 'х': 'h', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'sch',
+    'ъ': '', 'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya'
+}
+# Альтернативные варианты транслитерации, которые встречаются в slug-ах 2GIS
+_TRANSLIT_VARIANTS = [
+    {'х': 'kh', 'ё': 'e'},
+    {'щ': 'sh', 'й': 'i', 'ё': 'e'},
+]
+
+
+def _key(city: str) -> str:
+    return city.lower().strip()
+
+
+def transliterate(city: str, overrides: Optional[Dict[str, str]] = None) -> str:
+    table = dict(_TRANSLIT, **(overrides or {}))
+    return ''.join(
+        table.get(c, c) if c.isalpha() else ('_' if c in ' -' else c)
+        for c in _key(city)
+    )
+
+
+@dataclass
+class CityInfo:
+    name: str
+    country: str
+    slug: Optional[str]
+    volume: int
+
+
+class CityRegistry:
+    """
+    Slug-и и объём бизнеса по городам. Статическая таблица из config дополняется
+    кэшем на диске: slug-и, подтверждённые при поиске, и slug-и, на которых 2GIS вернул 404.
+    Подтверждённый slug снимается только после VERIFIED_FAILURES 404 подряд — разовая ошибка
+    сайта не должна навсегда ломать рабочий город.
+    """
+
+    VERIFIED_FAILURES = 3
+
+    def __init__(self, cache_path: Optional[Path] = CACHE_PATH):
+        self.cache_path = Path(cache_path) if cache_path else None
+        self._lock = threading.Lock()
+        self._cities: Dict[str, Dict[str, CityInfo]] = {}
+        self._verified: Dict[str, Dict[str, str]] = {}
+        self._invalid: Dict[str, Dict[str, List[str]]] = {}
+        self._failures: Dict[str, Dict[str, int]] = {}  # 404 подряд у подтверждённого slug-а
+
+        for country, cities in CITIES_BY_COUNTRY.items():
+            slugs = {_key(k): v for k, v in CITY_SLUGS.get(country, {}).items()}
+            volumes = {_key(k): v for k, v in CITY_VOLUME.get(country, {}).items()}
+            self._cities[country] = {
+                _key(name): CityInfo(
+                    name=name,
+                    country=country,
+                    slug=slugs.get(_key(name)),
+                    volume=volumes.get(_key(name), DEFAULT_CITY_VOLUME),
+                )
+                for name in cities
+            }
+        # Алиасы, которых нет в списке городов (например, «СПб»)
+        self._aliases = {'спб': 'spb'}
+        self._load_cache()
+
+    def _load_cache(self):
+        if not self.cache_path or not self.cache_path.exists():
+            return
+        try:
+            data = json.loads(self.cache_path.read_text(encoding='utf-8'))
+            self._verified = data.get('verified', {})
+            self._invalid = data.get('invalid', {})
+            self._failures = data.get('failures', {})
+        except (OSError, ValueError) as e:
+            logger.warning(f"Не удалось прочитать кэш городов {self.cache_path}: {e}")
+
+    def _save_cache(self):
+        if not self.cache_path:
+            return
+        try:
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.cache_path.with_suffix('.tmp')
+            tmp.write_text(
+                json.dumps({'verified': self._verified, 'invalid': self._invalid, 'failures': self._failures},
+                           ensure_ascii=False, indent=1),
+                encoding='utf-8'
+            )
+            tmp.replace(self.cache_path)
+        except OSError as e:
+            logger.warning(f"Не удалось сохранить кэш городов {self.cache_path}: {e}")
+
+    def get(self, city: str, country: Optional[str] = None) -> Optional[CityInfo]:
+        return self._cities.get(country or DEFAULT_COUNTRY, {}).get(_key(city))
+
+    def candidates(self, city: str, country: Optional[str] = None) -> List[str]:
+        """
+        Slug-и для проверки по порядку: подтверждённый (если есть) — единственный;
+        иначе slug из таблицы и варианты транслитерации без известных 404.
+        """
+        country = country or DEFAULT_COUNTRY
+        key = _key(city)
+        with self._lock:
+            verified = self._verified.get(country, {}).get(key)
+            if verified:
+                return [verified]
+            invalid = set(self._invalid.get(country, {}).get(key, []))
+        info = self.get(city, country)
+        result = []
+        for slug in [info.slug if info else None, self._aliases.get(key), transliterate(city)] + [
+            transliterate(city, v) for v in _TRANSLIT_VARIANTS
+        ]:
+            if slug and slug not in invalid and slug not in result:
+                result.append(slug)
+        return result
+
+    def slug(self, city: str, country: Optional[str] = None) -> str:
+        candidates = self.candidates(city, country)
+        return candidates[0] if candidates else transliterate(city)
+
+    def mark_verified(self, city: str, country: Optional[str], slug: str):
+        country = country or DEFAULT_COUNTRY
+        with self._lock:
+            failed = self._failures.get(country, {}).pop(_key(city), None)
+            if self._verified.get(country, {}).get(_key(city)) == slug and not failed:
+                return
+            self._verified.setdefault(country, {})[_key(city)] = slug
+            self._save_cache()
+
+    def mark_invalid(self, city: str, country: Optional[str], slug: str):
+        country = country or DEFAULT_COUNTRY
+        key = _key(city)
+        with self._lock:
+            if self._verified.get(country, {}).get(key) == slug:
+                failures = self._failures.setdefault(country, {})
+                failures[key] = failures.get(key, 0) + 1
+                if failures[key] < self.VERIFIED_FAILURES:
+                    self._save_cache()
+                    logger.warning(f"Подтверждённый slug '{slug}' для города {city} вернул 404 "
+                                   f"({failures[key]} из {self.VERIFIED_FAILURES}), оставлен")
+                    return
+                del failures[key]
+                del self._verified[country][key]
+            bad = self._invalid.setdefault(country, {}).setdefault(key, [])
+            if slug not in bad:
+                bad.append(slug)
+            self._save_cache()
+        logger.warning(f"Slug '{slug}' для города {city} не найден на 2GIS")
+
+    def cities_by_volume(self, country: str) -> List[CityInfo]:
+        """
+        Города страны от крупных к мелким. Города без рабочего slug-а и дубли
+        одного slug-а (Астана / Нур-Султан) пропускаются.
+        """
+        result = []
+        seen_slugs = set()
+        for info in sorted(self._cities.get(country, {}).values(), key=lambda c: -c.volume):
+            candidates = self.candidates(info.name, country)
+            if not candidates:
+                continue
+            if candidates[0] in seen_slugs:
+                continue
+            seen_slugs.add(candidates[0])
+            result.append(info)
+        return result
+
+
+CITY_REGISTRY = CityRegistry()
@@ -7,8 +7,12 @@ from typing import Optional
 
 import click
 
-from .scraper import TwoGISScraper
-from .excel_exporter import ExcelExporter
+from . import create_exporter, create_scraper, create_stream_writer
+from .batch import BatchScheduler, load_jobs
+from .card_cache import CardCache
+from .config import DEFAULT_LEASE_SECONDS, DEFAULT_PAGE_WORKERS, DEFAULT_PAGES_PER_TASK
+from .dedup import FirmIndex
+from .snapshot import Snapshot
 
 # Настройка логирования
 logging.basicConfig(
@@ -22,6 +26,12 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+def _check_seen_options(seen_db: Optional[str], new_only: bool):
+    """--new-only имеет смысл только с историей выгрузок"""
+    if new_only and not seen_db:
+        raise click.UsageError("--new-only требует --seen-db (файл ID фирм из прошлых выгрузок)")
+
+
 @click.group()
 def cli():
     """Система генерации лидов из данных 2GIS"""
@@ -35,7 +45,18 @@ def cli():
 @click.option('--output', '-o', default='2gis_results.xlsx', help='Имя выходного Excel файла')
 @click.option('--max-results', '-m', type=int, help='Максимальное количество результатов')
 @click.option('--headless/--no-headless', default=True, help='Запуск браузера в headless режиме')
-def search(city: str, country: str, category: Optional[str], output: str, max_results: Optional[int], headless: bool):
+@click.option('--page-workers', type=int, default=DEFAULT_PAGE_WORKERS, show_default=True,
+              help='Количество браузеров для параллельной загрузки страниц выдачи')
+@click.option('--seen-db', type=click.Path(dir_okay=False), help='Файл ID фирм из прошлых выгрузок (дополняется после успешного сохранения файла)')
+@click.option('--new-only', is_flag=True, help='Пропускать фирмы из --seen-db (только новые лиды)')
+@click.option('--seen-bloom', is_flag=True, help='Хранить историю --seen-db в bloom-фильтре (для миллионов фирм)')
+@click.option('--refresh', 'snapshot_db', type=click.Path(dir_okay=False),
+              help='Файл снимка прошлого запуска: телефоны только для новых/изменённых фирм, лист «Изменения»')
+@click.option('--card-cache', 'card_cache_db', type=click.Path(dir_okay=False),
+              help='Файл кэша разобранных карточек между запусками (в памяти кэш есть всегда)')
+def search(city: str, country: str, category: Optional[str], output: str, max_results: Optional[int], headless: bool,
+           page_workers: int, seen_db: Optional[str], new_only: bool, seen_bloom: bool, snapshot_db: Optional[str],
+           card_cache_db: Optional[str]):
     """
     Поиск компаний в 2GIS и экспорт результатов в Excel
     
@@ -52,7 +73,12 @@ def search(city: str, country: str, category: Optional[str], output: str, max_re
     \b
     Поиск всех компаний в Екатеринбурге:
     python main.py search --city Екатеринбург
+
+    \b
+    Еженедельное обновление списка (повторно грузятся телефоны только новых и изменённых фирм):
+    python main.py search -c Москва -cat Кафе --refresh cafe_moscow.snapshot
     """
+    _check_seen_options(seen_db, new_only)
     click.echo(f"🔍 Начинаю поиск компаний...")
     click.echo(f"   Страна: {country}")
     click.echo(f"   Город: {city}")
@@ -62,31 +88,48 @@ def search(city: str, country: str, category: Optional[str], output: str, max_re
     click.echo()
     
     companies = []
+    diff = None
     
     try:
-        # Инициализация скрапера
-        with TwoGISScraper(headless=headless) as scraper:
-            # Поиск компаний
-            click.echo("⏳ Загрузка данных с сайта 2GIS...")
-            companies = scraper.search_companies(
-                city=city,
-                category=category,
-                max_results=max_results,
-                country=country
-            )
-        
-        if not companies:
-            click.echo("❌ Компании не найдены. Проверьте параметры поиска.")
-            return
-        
-        # Экспорт в Excel
-        click.echo(f"\n📊 Найдено компаний: {len(companies)}")
-        click.echo(f"💾 Экспорт в Excel...")
-        
-        exporter = ExcelExporter()
-        filepath = exporter.export_to_excel(companies, output)
-        
+        with FirmIndex(seen_db, skip_known=new_only, use_bloom=seen_bloom) as firm_index:
+            # Инициализация скрапера
+            with CardCache(path=card_cache_db) as card_cache, \
+                    create_scraper(headless=headless, page_workers=page_workers, card_cache=card_cache) as scraper:
+                snapshot = Snapshot(snapshot_db) if snapshot_db else None
+                refresh = snapshot.session(city, category, country) if snapshot else None
+                # Поиск компаний
+                click.echo("⏳ Загрузка данных с сайта 2GIS...")
+                try:
+                    companies = scraper.search_companies(
+                        city=city,
+                        category=category,
+                        max_results=max_results,
+                        country=country,
+                        firm_index=firm_index,
+                        refresh=refresh
+                    )
+                    if refresh is not None:
+                        diff = refresh.finish()
+                finally:
+                    if snapshot:
+                        snapshot.close()
+
+            if not companies:
+                click.echo("❌ Компании не найдены. Проверьте параметры поиска.")
+                return
+
+            # Экспорт в Excel
+            click.echo(f"\n📊 Найдено компаний: {len(companies)}")
+            click.echo(f"💾 Экспорт в Excel...")
+
+            exporter = create_exporter()
+            filepath = exporter.export_to_excel(companies, output, diff=diff)
+            # История --seen-db пополняется только сохранённой выгрузкой
+            firm_index.commit()
+
         click.echo(f"\n✅ Готово! Результаты сохранены в: {filepath}")
+        if diff is not None:
+            click.echo(f"   Новых: {len(diff.new)}, изменённых: {len(diff.changed)}, исчезнувших: {len(diff.removed)}")
         click.echo(f"\n📋 Данные включают:")
         click.echo(f"   - Название компании")
         click.echo(f"   - Телефон")
@@ -106,5 +149,168 @@ def search(city: str, country: str, category: Optional[str], output: str, max_re
         sys.exit(1)
 
 
+@cli.command()
+@click.argument('jobs_file', type=click.Path(exists=True, dir_okay=False))
+@click.option('--output', '-o', default='2gis_batch_results.xlsx', help='Имя выходного Excel файла')
+@click.option('--workers', '-w', type=int, default=2, show_default=True, help='Количество браузеров в общем пуле')
+@click.option('--page-workers', type=int, default=1, show_default=True,
+              help='Браузеров на параллельную загрузку страниц внутри одного задания')
+@click.option('--headless/--no-headless', default=True, help='Запуск браузера в headless режиме')
+@click.option('--seen-db', type=click.Path(dir_okay=False), help='Файл ID фирм из прошлых выгрузок (дополняется после успешного сохранения файла)')
+@click.option('--new-only', is_flag=True, help='Пропускать фирмы из --seen-db (только новые лиды)')
+@click.option('--seen-bloom', is_flag=True, help='Хранить историю --seen-db в bloom-фильтре (для миллионов фирм)')
+@click.option('--refresh', 'snapshot_db', type=click.Path(dir_okay=False),
+              help='Файл снимка прошлого запуска: телефоны только для новых/изменённых фирм, лист «Изменения»')
+@click.option('--card-cache', 'card_cache_db', type=click.Path(dir_okay=False),
+              help='Файл кэша разобранных карточек между запусками (в памяти кэш есть всегда)')
+def batch(jobs_file: str, output: str, workers: int, page_workers: int, headless: bool,
+          seen_db: Optional[str], new_only: bool, seen_bloom: bool, snapshot_db: Optional[str],
+          card_cache_db: Optional[str]):
+    """
+    Пакетный поиск по файлу заданий (CSV или YAML) с общим пулом браузеров
+    
+    Колонки CSV: country, city, category, max_results, priority (необязательно).
+    Компании дедуплицируются по ID фирмы и записываются в один файл.
+    
+    \b
+    Пример:
+    python main.py batch jobs.csv -o leads.xlsx -w 4
+    """
+    _check_seen_options(seen_db, new_only)
+    try:
+        jobs = load_jobs(jobs_file)
+    except (OSError, ValueError) as e:
+        click.echo(f"❌ Не удалось прочитать файл заданий: {e}")
+        sys.exit(1)
+    if not jobs:
+        click.echo("❌ В файле нет заданий.")
+        return
+
+    click.echo(f"📦 Заданий: {len(jobs)}, браузеров: {workers}")
+    snapshot = Snapshot(snapshot_db) if snapshot_db else None
+    try:
+        with FirmIndex(seen_db, skip_known=new_only, use_bloom=seen_bloom) as firm_index:
+            with CardCache(path=card_cache_db) as card_cache, create_stream_writer(output) as writer:
+                scheduler = BatchScheduler(jobs, workers=workers, headless=headless, page_workers=page_workers,
+                                           firm_index=firm_index, snapshot=snapshot, card_cache=card_cache)
+                stats = scheduler.run(
+                    sink=writer.write,
+                    progress_callback=lambda done, total, label: click.echo(f"   [{done}/{total}] {label}")
+                )
+                if snapshot:
+                    writer.write_diff(scheduler.diff)
+            # Файл сохранён (writer закрыт без ошибки) — теперь можно пополнить историю --seen-db
+            firm_index.commit()
+    except KeyboardInterrupt:
+        click.echo("\n\n⚠️  Операция прервана пользователем")
+        sys.exit(1)
+    except Exception as e:
+        logger.error(f"Ошибка пакетного поиска: {str(e)}", exc_info=True)
+        click.echo(f"\n❌ Произошла ошибка: {str(e)}")
+        sys.exit(1)
+    finally:
+        if snapshot:
+            snapshot.close()
+
+    click.echo(f"\n✅ Готово! Результаты сохранены в: {writer.filepath}")
+    click.echo(f"   Выполнено заданий: {stats.jobs_done}, с ошибкой: {stats.jobs_failed}")
+    click.echo(f"   Компаний: {stats.companies}, дубликатов пропущено: {stats.duplicates}")
+    if snapshot:
+        diff = scheduler.diff
+        click.echo(f"   Новых: {len(diff.new)}, изменённых: {len(diff.changed)}, исчезнувших: {len(diff.removed)}")
+
+
+@cli.command()
+@click.argument('jobs_file', type=click.Path(exists=True, dir_okay=False))
+@click.option('--queue', '-q', 'queue_url', default='2gis_queue.sqlite3', show_default=True,
+              help='Очередь: путь к SQLite файлу или redis://host:port/db')
+@click.option('--output', '-o', default='2gis_distributed_results.xlsx', help='Имя выходного Excel файла')
+@click.option('--pages-per-task', type=int, default=DEFAULT_PAGES_PER_TASK, show_default=True,
+              help='Страниц выдачи в одном задании воркера')
+@click.option('--max-attempts', type=int, default=3, show_default=True, help='Попыток на задание')
+def coordinator(jobs_file: str, queue_url: str, output: str, pages_per_task: int, max_attempts: int):
+    """
+    Координатор распределённого обхода: ставит задания в очередь и собирает результаты
+    
+    Задания делятся на диапазоны страниц; их выполняют команды `worker`,
+    запущенные на этой или других машинах с доступом к той же очереди.
+    
+    \b
+    Пример:
+    python main.py coordinator jobs.csv -q redis://queue-host:6379/0
+    python main.py worker -q redis://queue-host:6379/0      (на каждой машине)
+    """
+    from .coordinator import Coordinator
+    from .task_queue import open_queue
+
+    try:
+        jobs = load_jobs(jobs_file)
+        task_queue = open_queue(queue_url, max_attempts=max_attempts)
+    except (OSError, ValueError) as e:
+        click.echo(f"❌ {e}")
+        sys.exit(1)
+    if not jobs:
+        click.echo("❌ В файле нет заданий.")
+        return
+
+    coord = Coordinator(task_queue, pages_per_task=pages_per_task)
+    coord.submit(jobs)
+    click.echo(f"📡 Запуск {coord.run_id}: {len(jobs)} заданий в очереди {queue_url}. Ожидаю воркеров...")
+
+    try:
+        with create_stream_writer(output) as writer:
+            stats = coord.run(
+                sink=writer.write,
+                progress_callback=lambda st, label: click.echo(
+                    f"   {label}: всего компаний {st.companies}, заданий {st.tasks_done} (ошибок {st.tasks_failed})"
+                )
+            )
+    except KeyboardInterrupt:
+        click.echo("\n\n⚠️  Операция прервана пользователем")
+        sys.exit(1)
+    finally:
+        task_queue.close()
+
+    click.echo(f"\n✅ Готово! Результаты сохранены в: {writer.filepath}")
+    click.echo(f"   Компаний: {stats.companies}, дубликатов пропущено: {stats.duplicates}")
+    click.echo(f"   Заданий выполнено: {stats.tasks_done}, с ошибкой: {stats.tasks_failed}")
+
+
+@cli.command()
+@click.option('--queue', '-q', 'queue_url', default='2gis_queue.sqlite3', show_default=True,
+              help='Очередь: путь к SQLite файлу или redis://host:port/db')
+@click.option('--lease', type=int, default=DEFAULT_LEASE_SECONDS, show_default=True,
+              help='Срок аренды задания, сек (продлевается, пока воркер жив)')
+@click.option('--idle-timeout', type=int, help='Завершиться, если заданий нет N секунд')
+@click.option('--page-workers', type=int, default=1, show_default=True,
+              help='Браузеров на параллельную загрузку страниц внутри задания')
+@click.option('--headless/--no-headless', default=True, help='Запуск браузера в headless режиме')
+def worker(queue_url: str, lease: int, idle_timeout: Optional[int], page_workers: int, headless: bool):
+    """Воркер распределённого обхода: берёт задания из очереди и выполняет их"""
+    from .coordinator import run_worker
+    from .task_queue import open_queue
+
+    try:
+        task_queue = open_queue(queue_url)
+    except (OSError, ValueError) as e:
+        click.echo(f"❌ {e}")
+        sys.exit(1)
+
+    click.echo(f"🛠  Воркер подключён к {queue_url}")
+    try:
+        done = run_worker(
+            task_queue,
+            scraper_factory=lambda: create_scraper(headless=headless, page_workers=page_workers),
+            lease_seconds=lease,
+            idle_timeout=idle_timeout
+        )
+    except KeyboardInterrupt:
+        click.echo("\n\n⚠️  Воркер остановлен")
+        sys.exit(1)
+    finally:
+        task_queue.close()
+    click.echo(f"✅ Выполнено заданий: {done}")
+
+
 if __name__ == '__main__':
     cli()
@@ -1,6 +1,17 @@
 """
-Конфигурация: города по странам для поиска по всей стране
+Конфигурация: города по странам для поиска по всей стране,
+проверенные slug-и 2GIS и оценка объёма бизнеса по городам
 """
+# Карточек компаний на одной странице выдачи 2GIS
+RESULTS_PER_PAGE = 12
+# Количество браузеров для параллельной загрузки страниц выдачи одного поиска
+DEFAULT_PAGE_WORKERS = 3
+# Распределённый обход: страниц выдачи в одном задании воркера и срок аренды задания (сек)
+DEFAULT_PAGES_PER_TASK = 5
+DEFAULT_LEASE_SECONDS = 300
+# Кэш разобранных карточек: сколько карточек держать в памяти
+DEFAULT_CARD_CACHE_SIZE = 20000
+
 CITIES_BY_COUNTRY = {
     "Россия": [
         "Москва", "Санкт-Петербург", "Новосибирск", "Екатеринбург", "Казань",
@@ -59,3 +70,70 @@ CITIES_BY_COUNTRY = {
         "Хива", "Ханка", "Хазарасп", "Шават",
     ],
 }
+
+# Проверенные slug-и городов в URL 2GIS (https://2gis.ru/<slug>/search/...).
+# Для городов, которых здесь нет, slug подбирается транслитерацией и проверяется при первом поиске.
+CITY_SLUGS = {
+    "Россия": {
+        "Москва": "moscow", "Санкт-Петербург": "spb", "Новосибирск": "novosibirsk",
+        "Екатеринбург": "ekb", "Казань": "kazan", "Нижний Новгород": "nizhniy_novgorod",
+        "Челябинск": "chelyabinsk", "Самара": "samara", "Омск": "omsk",
+        "Ростов-на-Дону": "rostov_na_donu", "Уфа": "ufa", "Красноярск": "krasnoyarsk",
+        "Воронеж": "voronezh", "Пермь": "perm", "Волгоград": "volgograd",
+        "Краснодар": "krasnodar",
+    },
+    "Казахстан": {
+        "Алматы": "almaty", "Астана": "astana", "Нур-Султан": "astana", "Шымкент": "shymkent",
+        "Караганда": "karaganda", "Актобе": "aktobe", "Усть-Каменогорск": "ust_kamenogorsk",
+        "Петропавловск": "petropavl", "Кокшетау": "kokchetav", "Талдыкорган": "taldykorgan",
+        "Атырау": "atyrau",
+    },
+    "Узбекистан": {
+        "Ташкент": "tashkent", "Самарканд": "samarkand",
+    },
+}
+
+# Оценка объёма бизнеса по городу (население, тыс. чел.) — для порядка обхода «Вся страна».
+# Для городов вне таблицы используется DEFAULT_CITY_VOLUME.
+DEFAULT_CITY_VOLUME = 50
+CITY_VOLUME = {
+    "Россия": {
+        "Москва": 13100, "Санкт-Петербург": 5600, "Новосибирск": 1630, "Екатеринбург": 1540,
+        "Казань": 1310, "Красноярск": 1200, "Нижний Новгород": 1210, "Челябинск": 1180,
+        "Уфа": 1160, "Самара": 1160, "Ростов-на-Дону": 1140, "Краснодар": 1100, "Омск": 1110,
+        "Воронеж": 1050, "Пермь": 1030, "Волгоград": 1020, "Саратов": 900, "Тюмень": 850,
+        "Тольятти": 680, "Барнаул": 630, "Ижевск": 630, "Махачкала": 620, "Хабаровск": 610,
+        "Ульяновск": 610, "Иркутск": 610, "Владивосток": 600, "Ярославль": 570, "Томск": 560,
+        "Ставрополь": 550, "Кемерово": 550, "Набережные Челны": 550, "Оренбург": 550,
+        "Новокузнецк": 540, "Рязань": 530, "Балашиха": 520, "Пенза": 500, "Липецк": 500,
+        "Чебоксары": 490, "Калининград": 490, "Астрахань": 470, "Тула": 470, "Киров": 470,
+        "Сочи": 440, "Курск": 440, "Улан-Удэ": 440, "Тверь": 420, "Магнитогорск": 410,
+        "Сургут": 400, "Брянск": 380, "Иваново": 360, "Владимир": 350, "Чита": 350,
+        "Белгород": 340, "Нижний Тагил": 340, "Новороссийск": 340, "Калуга": 330,
+        "Грозный": 330, "Волжский": 320, "Смоленск": 310, "Подольск": 310, "Курган": 300,
+        "Орёл": 300, "Владикавказ": 300, "Архангельск": 300, "Петрозаводск": 280,
+        "Йошкар-Ола": 280, "Нижневартовск": 280, "Мурманск": 270, "Кострома": 270,
+        "Тамбов": 260, "Химки": 260, "Таганрог": 250, "Нальчик": 250, "Сыктывкар": 240,
+        "Благовещенск": 240, "Шахты": 230, "Дзержинск": 230, "Энгельс": 230, "Мытищи": 230,
+        "Братск": 220, "Орск": 220, "Ангарск": 220, "Старый Оскол": 220,
+        "Великий Новгород": 220, "Королёв": 220, "Люберцы": 210, "Псков": 200, "Бийск": 200,
+        "Прокопьевск": 190, "Южно-Сахалинск": 180, "Армавир": 180, "Рыбинск": 180,
+        "Северодвинск": 180, "Петропавловск-Камчатский": 180, "Норильск": 180,
+        "Сызрань": 170, "Абакан": 180, "Уссурийск": 170, "Красногорск": 170,
+        "Электросталь": 150, "Миасс": 150, "Копейск": 150, "Одинцово": 180, "Пятигорск": 150,
+        "Каменск-Уральский": 160, "Волгодонск": 170, "Златоуст": 160, "Салават": 150,
+    },
+    "Казахстан": {
+        "Алматы": 2200, "Астана": 1400, "Шымкент": 1200, "Актобе": 560, "Караганда": 500,
+        "Тараз": 430, "Семей": 350, "Павлодар": 330, "Усть-Каменогорск": 330, "Уральск": 330,
+        "Атырау": 300, "Актау": 260, "Костанай": 250, "Кызылорда": 250, "Петропавловск": 220,
+        "Туркестан": 200, "Темиртау": 170, "Талдыкорган": 170, "Кокшетау": 150,
+        "Экибастуз": 150, "Рудный": 120, "Жезказган": 90, "Жанаозен": 160, "Балхаш": 70,
+    },
+    "Узбекистан": {
+        "Ташкент": 2900, "Наманган": 650, "Самарканд": 550, "Андижан": 450, "Нукус": 330,
+        "Фергана": 300, "Бухара": 280, "Карши": 280, "Коканд": 260, "Маргилан": 230,
+        "Термез": 190, "Джизак": 180, "Ангрен": 180, "Навои": 150, "Ургенч": 150,
+        "Чирчик": 150, "Алмалык": 130,
+    },
+}
@@ -0,0 +1,212 @@
+"""
+Распределённый обход: координатор делит задания (страна, город, категория) на диапазоны
+страниц и ставит их в очередь; воркеры (на этой или других машинах) выполняют их
+через TwoGISScraper и возвращают результаты через ту же очередь.
+"""
+import logging
+import math
+import socket
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, List, Optional
+
+from .batch import BatchJob
+from .config import DEFAULT_LEASE_SECONDS, DEFAULT_PAGES_PER_TASK, RESULTS_PER_PAGE
+from .dedup import FirmIndex
+from .models import Company
+from .task_queue import DONE, LEASED, PENDING, CrawlTask, TaskOutcome, TaskQueue
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CoordinatorStats:
+    tasks_done: int = 0
+    tasks_failed: int = 0
+    companies: int = 0
+    duplicates: int = 0
+
+
+class Coordinator:
+    """
+    Для каждого задания сначала ставится диапазон 1..pages_per_task. Когда воркер вернёт
+    число страниц (прочитанное с первой страницы), ставятся остальные диапазоны сразу —
+    при max_results только столько страниц, сколько нужно для недостающих компаний
+    (с учётом ещё не вернувшихся диапазонов); если число неизвестно — по одному следующему
+    диапазону, пока есть следующая страница.
+    """
+
+    def __init__(self, task_queue: TaskQueue, pages_per_task: int = DEFAULT_PAGES_PER_TASK,
+                 firm_index: Optional[FirmIndex] = None):
+        self.queue = task_queue
+        self.pages_per_task = max(1, pages_per_task)
+        self.firm_index = firm_index if firm_index is not None else FirmIndex()
+        self.run_id = uuid.uuid4().hex[:12]
+        self.stats = CoordinatorStats()
+        self._jobs: Dict[str, BatchJob] = {}
+        self._found: Dict[str, int] = {}
+        self._total_pages: Dict[str, int] = {}
+        self._slugs: Dict[str, str] = {}
+        self._queued_to: Dict[str, int] = {}     # последняя поставленная страница
+        self._outstanding: Dict[str, int] = {}   # страниц в поставленных, но не вернувшихся диапазонах
+
+    def _put_range(self, job_id: str, page_start: int, page_end: int):
+        job = self._jobs[job_id]
+        self.queue.put(CrawlTask(
+            run_id=self.run_id, job_id=job_id, city=job.city, country=job.country,
+            category=job.category, page_start=page_start, page_end=page_end, priority=job.priority,
+            city_slug=self._slugs.get(job_id),
+        ))
+        self._queued_to[job_id] = max(self._queued_to.get(job_id, 0), page_end)
+        self._outstanding[job_id] = self._outstanding.get(job_id, 0) + page_end - page_start + 1
+
+    def _reached(self, job_id: str) -> bool:
+        job = self._jobs[job_id]
+        return bool(job.max_results) and self._found[job_id] >= job.max_results
+
+    def _top_up(self, job_id: str):
+        """Поставить диапазоны до конца выдачи, а при max_results — на недостающие компании"""
+        job = self._jobs[job_id]
+        last = self._total_pages[job_id]
+        if job.max_results:
+            need = math.ceil((job.max_results - self._found[job_id]) / RESULTS_PER_PAGE) - self._outstanding[job_id]
+            if need <= 0:
+                return
+            last = min(last, self._queued_to[job_id] + need)
+        for start in range(self._queued_to[job_id] + 1, last + 1, self.pages_per_task):
+            self._put_range(job_id, start, min(start + self.pages_per_task - 1, last))
+
+    def submit(self, jobs: List[BatchJob]):
+        for idx, job in enumerate(jobs):
+            job_id = str(idx)
+            self._jobs[job_id] = job
+            self._found[job_id] = 0
+            first_end = self.pages_per_task
+            if job.max_results:
+                first_end = min(first_end, math.ceil(job.max_results / RESULTS_PER_PAGE))
+            self._put_range(job_id, 1, first_end)
+        logger.info(f"Запуск {self.run_id}: поставлено заданий {len(jobs)}")
+
+    def _handle_done(self, task: CrawlTask, result: dict, sink: Callable[[Company], None]):
+        job = self._jobs.get(task.job_id)
+        if job is None:
+            return
+        if result.get('city_slug'):
+            self._slugs.setdefault(task.job_id, result['city_slug'])
+
+        for data in result.get('companies', []):
+            if self._reached(task.job_id):
+                break
+            company = Company(**data)
+            if not self.firm_index.add(company):
+                continue
+            sink(company)
+            self._found[task.job_id] += 1
+            self.stats.companies += 1
+        if self._reached(task.job_id):
+            self.queue.cancel_job(self.run_id, task.job_id)
+            return
+
+        if task.page_start == 1 and result.get('total_pages'):
+            self._total_pages[task.job_id] = result['total_pages']
+        if task.job_id in self._total_pages:
+            # Дубли и пустые страницы могли оставить недобор — доставить недостающие страницы
+            self._top_up(task.job_id)
+        elif result.get('has_more'):
+            start = task.page_end + 1
+            self._put_range(task.job_id, start, start + self.pages_per_task - 1)
+
+    def _process(self, outcomes: List[TaskOutcome], sink: Callable[[Company], None], progress_callback=None):
+        for outcome in outcomes:
+            task = outcome.task
+            if task.job_id in self._outstanding:
+                self._outstanding[task.job_id] -= task.page_end - task.page_start + 1
+            label = f"{task.city} / {task.category or 'все'} / стр. {task.page_start}-{task.page_end}"
+            if outcome.status == DONE:
+                self.stats.tasks_done += 1
+                self._handle_done(task, outcome.result or {}, sink)
+            else:
+                self.stats.tasks_failed += 1
+                logger.error(f"Задание {label} не выполнено после {task.attempts} попыток: {outcome.error}")
+            self.stats.duplicates = self.firm_index.duplicates
+            if progress_callback:
+                progress_callback(self.stats, label)
+
+    def run(self, sink: Callable[[Company], None], poll_interval: float = 2.0, progress_callback=None) -> CoordinatorStats:
+        """Ожидание выполнения всех заданий запуска; sink вызывается для каждой новой компании."""
+        while True:
+            self._process(self.queue.pop_outcomes(self.run_id), sink, progress_callback)
+            counts = self.queue.counts(self.run_id)
+            if not counts.get(PENDING) and not counts.get(LEASED):
+                # Результаты, пришедшие между pop_outcomes и counts, могут поставить новые диапазоны
+                outcomes = self.queue.pop_outcomes(self.run_id)
+                if not outcomes:
+                    return self.stats
+                self._process(outcomes, sink, progress_callback)
+                continue
+            time.sleep(poll_interval)
+
+
+def run_worker(task_queue: TaskQueue, scraper_factory: Callable, worker_id: Optional[str] = None,
+               lease_seconds: float = DEFAULT_LEASE_SECONDS, idle_timeout: Optional[float] = None,
+               poll_interval: float = 5.0, stop_event: Optional[threading.Event] = None) -> int:
+    """
+    Цикл воркера: взять задание, выполнить search_pages, вернуть результат.
+    Аренда продлевается в фоне, пока задание выполняется. idle_timeout — завершиться,
+    если очередь пуста дольше указанного времени (None — работать до остановки).
+    Возвращает число выполненных заданий.
+    """
+    worker_id = worker_id or f"{socket.gethostname()}-{uuid.uuid4().hex[:6]}"
+    stop_event = stop_event or threading.Event()
+    done = 0
+    idle_since = time.time()
+    scraper = None
+    try:
+        while not stop_event.is_set():
+            task = task_queue.claim(worker_id, lease_seconds)
+            if task is None:
+                if idle_timeout is not None and time.time() - idle_since > idle_timeout:
+                    break
+                stop_event.wait(poll_interval)
+                continue
+            idle_since = time.time()
+            if scraper is None:
+                scraper = scraper_factory()
+
+            finished = threading.Event()
+
+            def heartbeat():
+                while not finished.wait(lease_seconds / 3):
+                    if not task_queue.extend(task.id, worker_id, lease_seconds):
+                        logger.warning(f"Аренда задания {task.id} потеряна")
+                        return
+
+            keeper = threading.Thread(target=heartbeat, daemon=True)
+            keeper.start()
+            try:
+                companies, total_pages, has_more, city_slug = scraper.search_pages(
+                    task.city, task.category, task.country, task.page_start, task.page_end,
+                    city_slug=task.city_slug
+                )
+                task_queue.complete(task.id, worker_id, {
+                    'companies': [asdict(c) for c in companies],
+                    'total_pages': total_pages,
+                    'has_more': has_more,
+                    'city_slug': city_slug,
+                })
+                done += 1
+            except Exception as e:
+                logger.error(f"Воркер {worker_id}: ошибка задания {task.city} "
+                             f"стр. {task.page_start}-{task.page_end}: {e}", exc_info=True)
+                task_queue.fail(task.id, worker_id, str(e))
+            finally:
+                finished.set()
+                keeper.join()
+            idle_since = time.time()
+    finally:
+        if scraper is not None:
+            scraper.close()
+    logger.info(f"Воркер {worker_id} завершён, выполнено заданий: {done}")
+    return done
@@ -0,0 +1,137 @@
+"""
+Индекс дедупликации фирм по числовому ID (/firm/<id>).
+Проверка и добавление за O(1); история прошлых запусков может храниться на диске
+(файл ID, по одному на строку) и загружаться в set или в bloom-фильтр.
+"""
+import hashlib
+import logging
+import math
+import threading
+from pathlib import Path
+from typing import Optional, Union
+
+from .models import Company, extract_firm_id
+
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter:
+    """Bloom-фильтр на bytearray: фиксированная память, ложноположительные ответы с вероятностью error_rate"""
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        capacity = max(1, capacity)
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hash_count))
+
+    def add(self, key: str):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+def firm_key(item: Union[Company, str, None]) -> Optional[Union[int, str]]:
+    """Ключ дедупликации: числовой ID фирмы, иначе URL без query-параметров"""
+    url = item.url if isinstance(item, Company) else item
+    if not url:
+        return None
+    firm_id = extract_firm_id(url)
+    if firm_id:
+        return int(firm_id)
+    return url.split('?')[0].rstrip('/')
+
+
+class FirmIndex:
+    """
+    Множество уже встреченных фирм. Общий экземпляр передаётся через все уровни:
+    страницы одного поиска, города «Вся страна», задания пакета.
+
+    path — файл истории прошлых выгрузок. Новые ID копятся в памяти и дописываются в файл
+    только через commit() — после успешного экспорта; close() без commit() их отбрасывает,
+    иначе фирмы из несохранённой выгрузки навсегда считались бы уже выгруженными.
+    skip_known — пропускать фирмы из истории (режим «только новые лиды»).
+    use_bloom — держать историю в bloom-фильтре вместо set (для миллионов ID).
+    """
+
+    BLOOM_MIN_CAPACITY = 1_000_000
+
+    def __init__(self, path: Optional[str] = None, skip_known: bool = False,
+                 use_bloom: bool = False, error_rate: float = 0.001):
+        self.path = Path(path) if path else None
+        self.skip_known = skip_known
+        self.duplicates = 0
+        self._current = set()
+        self._history = set()
+        self._lock = threading.Lock()
+        self._new = []
+
+        if self.path and self.path.exists():
+            with open(self.path, encoding='utf-8') as f:
+                lines = [line.strip() for line in f if line.strip()]
+            if use_bloom:
+                self._history = BloomFilter(max(self.BLOOM_MIN_CAPACITY, len(lines) * 2), error_rate)
+            for line in lines:
+                self._history.add(line)
+            logger.info(f"Загружено ранее выгруженных фирм: {len(lines)} из {self.path}")
+        elif use_bloom:
+            self._history = BloomFilter(self.BLOOM_MIN_CAPACITY, error_rate)
+
+    def __contains__(self, item) -> bool:
+        key = firm_key(item)
+        if key is None:
+            return False
+        with self._lock:
+            return key in self._current or (self.skip_known and str(key) in self._history)
+
+    def __len__(self) -> int:
+        return len(self._current)
+
+    def add(self, item: Union[Company, str]) -> bool:
+        """Добавить фирму. False — дубликат (в этом запуске или, при skip_known, в истории)."""
+        key = firm_key(item)
+        if key is None:
+            return True
+        with self._lock:
+            if key in self._current:
+                self.duplicates += 1
+                return False
+            known = str(key) in self._history
+            if known and self.skip_known:
+                self.duplicates += 1
+                return False
+            self._current.add(key)
+            if self.path and not known:
+                self._new.append(key)
+            return True
+
+    def commit(self) -> int:
+        """Дописать новые ID в файл истории (вызывать после сохранения выгрузки). Возвращает их число."""
+        with self._lock:
+            new, self._new = self._new, []
+        if not self.path or not new:
+            return 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.writelines(f"{key}\n" for key in new)
+        logger.info(f"В историю {self.path} добавлено фирм: {len(new)}")
+        return len(new)
+
+    def close(self):
+        with self._lock:
+            if self._new:
+                logger.warning(f"Выгрузка не сохранена — {len(self._new)} новых фирм не записаны в {self.path}")
+            self._new = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
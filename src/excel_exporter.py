@@ -3,100 +3,204 @@
 Корректная запись всех полей, URL как гиперссылки.
 """
 import logging
-from typing import List
+from typing import Iterable, List, Optional
 from pathlib import Path
 
 from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import Font, Alignment, PatternFill
 
 from .models import Company
+from .snapshot import RefreshDiff
 
 logger = logging.getLogger(__name__)
 
+HEADERS = [
+    'Название компании',
+    'Город',
+    'Телефон',
+    'Адрес',
+    'Рейтинг',
+    'Количество голосов',
+    'Информация',
+    'Ссылка'
+]
+COLUMN_WIDTHS = {'A': 35, 'B': 18, 'C': 38, 'D': 45, 'E': 10, 'F': 15, 'G': 50, 'H': 12}
+# Лист разницы с прошлым запуском (режим обновления): колонка статуса перед основными
+DIFF_SHEET_TITLE = "Изменения"
+DIFF_STATUS_LABELS = {'new': 'Новая', 'changed': 'Изменена', 'removed': 'Исчезла'}
+DIFF_COLUMN_WIDTHS = {'A': 12, 'B': 35, 'C': 18, 'D': 38, 'E': 45, 'F': 10, 'G': 15, 'H': 50, 'I': 12}
+
+HEADER_FILL = PatternFill(start_color="27AE60", end_color="27AE60", fill_type="solid")
+HEADER_FONT = Font(bold=True, color="FFFFFF", size=11)
+HEADER_ALIGNMENT = Alignment(horizontal="center", vertical="center", wrap_text=True)
+CELL_ALIGNMENT = Alignment(horizontal="left", vertical="top", wrap_text=True)
+LINK_FONT = Font(color="0563C1", underline="single")
+
+
+def _row_values(company: Company) -> list:
+    """Значения ячеек строки (в порядке колонок 1..7, без ссылки)"""
+    name = (company.name or '').strip() or '—'
+    city = (company.city or '').strip() or '—'
+    phone = (company.phone or '').strip() or '—'
+    address = (company.address or '').strip() or '—'
+    rating_str = str(company.rating) if company.rating is not None else '—'
+    voters_str = str(company.voters_count) if company.voters_count is not None else '—'
+    info = (company.info or '').strip() or '—'
+    return [
+        str(name)[:500],
+        str(city)[:80],
+        str(phone)[:100],
+        str(info)[:500],
+        rating_str,
+        voters_str,
+        str(address)[:1000],
+    ]
+
+
+def _diff_rows(diff: RefreshDiff):
+    """(статус, компания) для листа изменений"""
+    for status, companies in (('new', diff.new), ('changed', diff.changed), ('removed', diff.removed)):
+        for company in companies:
+            yield DIFF_STATUS_LABELS[status], company
+
+
+def _ensure_filepath(filename: str) -> Path:
+    filepath = Path(filename)
+    if not filepath.suffix:
+        filepath = filepath.with_suffix('.xlsx')
+    if not filepath.is_absolute():
+        filepath = Path.cwd() / filepath
+    filepath.parent.mkdir(parents=True, exist_ok=True)
+    return filepath
+
 
 class ExcelExporter:
     def __init__(self):
         self.workbook = None
         self.worksheet = None
 
-    def export_to_excel(self, companies: List[Company], filename: str) -> str:
+    def export_to_excel(self, companies: List[Company], filename: str, diff: Optional[RefreshDiff] = None) -> str:
+        """diff — разница с прошлым запуском, пишется на отдельный лист «Изменения»"""
         if not companies:
             raise ValueError("Список компаний пуст")
 
         self.workbook = Workbook()
         self.worksheet = self.workbook.active
         self.worksheet.title = "Компании 2GIS"
+        self._write_sheet(self.worksheet, HEADERS, ((None, c) for c in companies), COLUMN_WIDTHS)
+        if diff is not None:
+            sheet = self.workbook.create_sheet(DIFF_SHEET_TITLE)
+            self._write_sheet(sheet, ['Статус'] + HEADERS, _diff_rows(diff), DIFF_COLUMN_WIDTHS)
 
-        headers = [
-            'Название компании',
-            'Город',
-            'Телефон',
-            'Адрес',
-            'Рейтинг',
-            'Количество голосов',
-            'Информация',
-            'Ссылка'
-        ]
-        header_fill = PatternFill(start_color="27AE60", end_color="27AE60", fill_type="solid")
-        header_font = Font(bold=True, color="FFFFFF", size=11)
+        filepath = self._ensure_filepath(filename)
+        self.workbook.save(filepath)
+        logger.info(f"Файл сохранен: {filepath}")
+        return str(filepath)
 
+    def _write_sheet(self, sheet, headers: List[str], rows, widths: dict):
         for col, h in enumerate(headers, 1):
-            cell = self.worksheet.cell(row=1, column=col)
+            cell = sheet.cell(row=1, column=col)
             cell.value = h
-            cell.fill = header_fill
-            cell.font = header_font
-            cell.alignment = Alignment(horizontal="center", vertical="center", wrap_text=True)
-
-        for row_idx, company in enumerate(companies, start=2):
-            name = (company.name or '').strip() or '—'
-            city = (company.city or '').strip() or '—'
-            phone = (company.phone or '').strip() or '—'
-            address = (company.address or '').strip() or '—'
-            rating_str = str(company.rating) if company.rating is not None else '—'
-            voters_str = str(company.voters_count) if company.voters_count is not None else '—'
-            info = (company.info or '').strip() or '—'
-            url = (company.url or '').strip() or ''
+            cell.fill = HEADER_FILL
+            cell.font = HEADER_FONT
+            cell.alignment = HEADER_ALIGNMENT
 
-            self.worksheet.cell(row=row_idx, column=1, value=str(name)[:500])
-            self.worksheet.cell(row=row_idx, column=2, value=str(city)[:80])
-            self.worksheet.cell(row=row_idx, column=3, value=str(phone)[:100])
-            self.worksheet.cell(row=row_idx, column=4, value=str(info)[:500])
-            self.worksheet.cell(row=row_idx, column=5, value=rating_str)
-            self.worksheet.cell(row=row_idx, column=6, value=voters_str)
-            self.worksheet.cell(row=row_idx, column=7, value=str(address)[:1000])
-            link_cell = self.worksheet.cell(row=row_idx, column=8)
+        for row_idx, (status, company) in enumerate(rows, start=2):
+            values = _row_values(company)
+            if status is not None:
+                values.insert(0, status)
+            for col, value in enumerate(values, 1):
+                sheet.cell(row=row_idx, column=col, value=value)
+            url = (company.url or '').strip() or ''
+            link_cell = sheet.cell(row=row_idx, column=len(values) + 1)
             if url and url.startswith('http'):
                 # Короткий текст вместо длинного URL — гиперссылка работает при клике
                 link_cell.hyperlink = url.split('?')[0]  # Убираем query-параметры для стабильности
                 link_cell.value = "Открыть"
-                link_cell.font = Font(color="0563C1", underline="single")
+                link_cell.font = LINK_FONT
             else:
                 link_cell.value = url or '—'
 
-            for col in range(1, 9):
-                self.worksheet.cell(row=row_idx, column=col).alignment = Alignment(
-                    horizontal="left", vertical="top", wrap_text=True
-                )
-
-        self.worksheet.column_dimensions['A'].width = 35
-        self.worksheet.column_dimensions['B'].width = 18
-        self.worksheet.column_dimensions['C'].width = 38
-        self.worksheet.column_dimensions['D'].width = 45
-        self.worksheet.column_dimensions['E'].width = 10
-        self.worksheet.column_dimensions['F'].width = 15
-        self.worksheet.column_dimensions['G'].width = 50
-        self.worksheet.column_dimensions['H'].width = 12
+            for col in range(1, len(headers) + 1):
+                sheet.cell(row=row_idx, column=col).alignment = CELL_ALIGNMENT
 
-        filepath = self._ensure_filepath(filename)
-        self.workbook.save(filepath)
-        logger.info(f"Файл сохранен: {filepath}")
-        return str(filepath)
+        for col, width in widths.items():
+            sheet.column_dimensions[col].width = width
 
     def _ensure_filepath(self, filename: str) -> Path:
-        filepath = Path(filename)
-        if not filepath.suffix:
-            filepath = filepath.with_suffix('.xlsx')
-        if not filepath.is_absolute():
-            filepath = Path.cwd() / filepath
-        filepath.parent.mkdir(parents=True, exist_ok=True)
-        return filepath
+        return _ensure_filepath(filename)
+
+
+class ExcelStreamWriter:
+    """
+    Потоковая запись в Excel (write-only режим openpyxl): строки пишутся по мере
+    поступления и не накапливаются в памяти. Формат файла совпадает с ExcelExporter.
+    """
+
+    def __init__(self, filename: str):
+        self.filepath = _ensure_filepath(filename)
+        self.rows_written = 0
+        self.workbook = Workbook(write_only=True)
+        self.worksheet = self.workbook.create_sheet("Компании 2GIS")
+        for col, width in COLUMN_WIDTHS.items():
+            self.worksheet.column_dimensions[col].width = width
+        self.worksheet.append(self._header_row(self.worksheet, HEADERS))
+
+    def _header_row(self, sheet, headers: List[str]) -> list:
+        row = []
+        for h in headers:
+            cell = WriteOnlyCell(sheet, value=h)
+            cell.fill = HEADER_FILL
+            cell.font = HEADER_FONT
+            cell.alignment = HEADER_ALIGNMENT
+            row.append(cell)
+        return row
+
+    def _company_row(self, sheet, company: Company, status: Optional[str] = None) -> list:
+        values = _row_values(company)
+        if status is not None:
+            values.insert(0, status)
+        row = []
+        for value in values:
+            cell = WriteOnlyCell(sheet, value=value)
+            cell.alignment = CELL_ALIGNMENT
+            row.append(cell)
+        url = (company.url or '').strip() or ''
+        if url and url.startswith('http'):
+            link_cell = WriteOnlyCell(sheet, value="Открыть")
+            link_cell.hyperlink = url.split('?')[0]
+            link_cell.font = LINK_FONT
+        else:
+            link_cell = WriteOnlyCell(sheet, value=url or '—')
+        link_cell.alignment = CELL_ALIGNMENT
+        row.append(link_cell)
+        return row
+
+    def write(self, company: Company):
+        self.worksheet.append(self._company_row(self.worksheet, company))
+        self.rows_written += 1
+
+    def write_many(self, companies: Iterable[Company]):
+        for company in companies:
+            self.write(company)
+
+    def write_diff(self, diff: RefreshDiff):
+        """Лист «Изменения» (write-only: вызывать после всех write(), перед close())"""
+        sheet = self.workbook.create_sheet(DIFF_SHEET_TITLE)
+        for col, width in DIFF_COLUMN_WIDTHS.items():
+            sheet.column_dimensions[col].width = width
+        sheet.append(self._header_row(sheet, ['Статус'] + HEADERS))
+        for status, company in _diff_rows(diff):
+            sheet.append(self._company_row(sheet, company, status))
+
+    def close(self) -> str:
+        self.workbook.save(self.filepath)
+        logger.info(f"Файл сохранен: {self.filepath} ({self.rows_written} строк)")
+        return str(self.filepath)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
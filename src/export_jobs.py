@@ -0,0 +1,130 @@
+"""
+Фоновый экспорт результатов в Excel: файл пишется в отдельном потоке, прогресс
+(записано строк из общего числа) доступен по ID задания, готовый файл забирается отдельно.
+Несколько экспортов могут идти одновременно и не блокируют обработку запросов.
+"""
+import itertools
+import logging
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Optional
+
+from .result_store import ResultStore
+
+logger = logging.getLogger(__name__)
+
+PENDING = 'pending'
+RUNNING = 'running'
+SAVING = 'saving'
+DONE = 'done'
+ERROR = 'error'
+
+
+@dataclass
+class ExportJob:
+    id: str
+    filename: str
+    total: int
+    status: str = PENDING
+    rows_written: int = 0
+    error: Optional[str] = None
+    filepath: Optional[str] = None
+    created: float = field(default_factory=time.time)
+    finished: Optional[float] = None
+
+    def to_dict(self) -> dict:
+        return {
+            'id': self.id,
+            'status': self.status,
+            'rows_written': self.rows_written,
+            'total': self.total,
+            'filename': self.filename,
+            'error': self.error,
+        }
+
+
+class ExportManager:
+    """
+    Очередь фоновых экспортов. max_workers — сколько файлов пишется одновременно;
+    keep_jobs — сколько последних заданий (и их файлов) хранить.
+    """
+
+    PROGRESS_EVERY = 500
+
+    def __init__(self, max_workers: int = 2, keep_jobs: int = 20):
+        self.keep_jobs = keep_jobs
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='2gis-export')
+        self._jobs: Dict[str, ExportJob] = {}
+        self._dirs: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, store: ResultStore, filename: str = '2gis_results.xlsx') -> ExportJob:
+        """
+        Поставить экспорт текущих строк хранилища (строки, добавленные позже, в файл не попадут).
+        Хранилище удерживается открытым до конца экспорта, даже если его заменит новый поиск.
+        RuntimeError — хранилище уже закрыто.
+        """
+        store.acquire()
+        job = ExportJob(id=uuid.uuid4().hex[:12], filename=filename, total=len(store))
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        self._executor.submit(self._run, job, store)
+        return job
+
+    def get(self, job_id: str) -> Optional[ExportJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run(self, job: ExportJob, store: ResultStore):
+        from . import create_stream_writer
+
+        job.status = RUNNING
+        try:
+            directory = tempfile.mkdtemp(prefix='2gis_export_')
+            with self._lock:
+                self._dirs[job.id] = directory
+            writer = create_stream_writer(str(Path(directory) / job.filename))
+            try:
+                for company in itertools.islice(store.iter_companies(), job.total):
+                    writer.write(company)
+                    if writer.rows_written % self.PROGRESS_EVERY == 0:
+                        job.rows_written = writer.rows_written
+                job.rows_written = writer.rows_written
+                job.status = SAVING
+            finally:
+                # write-only книга держит открытый XML-поток — закрываем и при ошибке
+                # (неполный файл удаляется вместе с каталогом задания)
+                filepath = writer.close()
+            job.filepath = filepath
+            job.status = DONE
+            logger.info(f"Экспорт {job.id}: {job.rows_written} строк, {job.filepath}")
+        except Exception as e:
+            logger.error(f"Ошибка экспорта {job.id}: {e}", exc_info=True)
+            job.error = str(e)
+            job.status = ERROR
+        finally:
+            store.release()
+            job.finished = time.time()
+
+    def _prune(self):
+        """Удалить самые старые завершённые задания сверх keep_jobs (вместе с файлами)"""
+        finished = sorted((j for j in self._jobs.values() if j.status in (DONE, ERROR)), key=lambda j: j.created)
+        for job in finished[:max(0, len(self._jobs) - self.keep_jobs)]:
+            del self._jobs[job.id]
+            directory = self._dirs.pop(job.id, None)
+            if directory:
+                shutil.rmtree(directory, ignore_errors=True)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            for directory in self._dirs.values():
+                shutil.rmtree(directory, ignore_errors=True)
+            self._dirs.clear()
@@ -1,9 +1,20 @@
 """
 Модели данных для системы генерации лидов
 """
+import re
 from dataclasses import dataclass
 from typing import Optional
 
+_FIRM_ID_RE = re.compile(r'/firm/(\d+)')
+
+
+def extract_firm_id(url: Optional[str]) -> Optional[str]:
+    """Числовой ID фирмы из ссылки вида .../firm/<id>?..."""
+    if not url:
+        return None
+    m = _FIRM_ID_RE.search(url)
+    return m.group(1) if m else None
+
 
 @dataclass
 class Company:
@@ -17,6 +28,10 @@ class Company:
     url: Optional[str] = None
     city: Optional[str] = None
 
+    @property
+    def firm_id(self) -> Optional[str]:
+        return extract_firm_id(self.url)
+
     def to_dict(self) -> dict:
         """Преобразование в словарь для экспорта"""
         return {
@@ -0,0 +1,197 @@
+"""
+Хранилище результатов поиска на диске (SQLite).
+Компании пишутся по мере поступления и читаются страницами — в памяти не держатся.
+"""
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+from typing import Iterator, List, Optional, Tuple
+
+from .models import Company
+
+logger = logging.getLogger(__name__)
+
+_COLUMNS = {
+    'name': 'TEXT', 'phone': 'TEXT', 'address': 'TEXT', 'rating': 'REAL',
+    'voters_count': 'INTEGER', 'info': 'TEXT', 'url': 'TEXT', 'city': 'TEXT',
+}
+_FIELDS = tuple(_COLUMNS)
+# Сортировка таблицы результатов: ключ из запроса -> колонка (только из этого списка попадает в SQL)
+_SORT_COLUMNS = {'name': 'name', 'city': 'city', 'rating': 'rating', 'votes': 'voters_count'}
+
+
+def _casefold_cmp(a: str, b: str) -> int:
+    a, b = a.casefold(), b.casefold()
+    return (a > b) - (a < b)
+
+
+class ResultStore:
+    """
+    Результаты одного поиска. path=None — временный файл, удаляется при close().
+    Фоновые читатели (экспорт) берут хранилище через acquire()/release(): close() во время
+    чтения только помечает хранилище, соединение закрывается после release() последнего читателя.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self._owns_file = path is None
+        if path is None:
+            fd, path = tempfile.mkstemp(prefix='2gis_results_', suffix='.sqlite3')
+            os.close(fd)
+        self.path = path
+        self._lock = threading.Lock()
+        self._count = 0
+        self._readers = 0
+        self._closing = False
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        # NOCASE в SQLite сравнивает без учёта регистра только латиницу
+        self._conn.create_collation('CASEFOLD', _casefold_cmp)
+        self._conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS companies (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                {', '.join(f'{name} {kind}' for name, kind in _COLUMNS.items())}
+            )
+        ''')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_companies_city ON companies(city)')
+        self._conn.commit()
+        self._count = self._conn.execute('SELECT COUNT(*) FROM companies').fetchone()[0]
+
+    def add(self, company: Company):
+        self.add_many([company])
+
+    def add_many(self, companies: List[Company]):
+        if not companies:
+            return
+        rows = [tuple(getattr(c, f) for f in _FIELDS) for c in companies]
+        with self._lock:
+            self._conn.executemany(
+                f"INSERT INTO companies ({', '.join(_FIELDS)}) VALUES ({', '.join('?' * len(_FIELDS))})",
+                rows
+            )
+            self._conn.commit()
+            self._count += len(rows)
+
+    def __len__(self) -> int:
+        return self._count
+
+    @staticmethod
+    def _where(city: Optional[str], min_rating: Optional[float], has_phone: bool) -> Tuple[str, list]:
+        """Условие WHERE для фильтров таблицы результатов"""
+        clauses, params = [], []
+        if city:
+            clauses.append('city = ?')
+            params.append(city)
+        if min_rating:
+            clauses.append('rating >= ?')
+            params.append(min_rating)
+        if has_phone:
+            clauses.append("phone IS NOT NULL AND phone != ''")
+        return (' WHERE ' + ' AND '.join(clauses) if clauses else ''), params
+
+    def count(self, city: Optional[str] = None, min_rating: Optional[float] = None, has_phone: bool = False) -> int:
+        if not (city or min_rating or has_phone):
+            return self._count
+        where, params = self._where(city, min_rating, has_phone)
+        with self._lock:
+            if self._conn is None:
+                return 0
+            return self._conn.execute(f'SELECT COUNT(*) FROM companies{where}', params).fetchone()[0]
+
+    def cities(self) -> List[str]:
+        with self._lock:
+            if self._conn is None:
+                return []
+            rows = self._conn.execute(
+                'SELECT city FROM companies WHERE city IS NOT NULL GROUP BY city ORDER BY MIN(id)'
+            ).fetchall()
+        return [r[0] for r in rows]
+
+    @staticmethod
+    def _order_by(sort: Optional[str]) -> str:
+        """ORDER BY для ключа сортировки ('rating', '-rating'...); пустые значения всегда в конце"""
+        column = _SORT_COLUMNS.get((sort or '').lstrip('-'))
+        if column is None:
+            return 'id'
+        direction = 'DESC' if sort.startswith('-') else 'ASC'
+        collate = ' COLLATE CASEFOLD' if _COLUMNS[column] == 'TEXT' else ''
+        return f"{column} IS NULL, {column}{collate} {direction}, id"
+
+    def page(self, offset: int = 0, limit: int = 100, city: Optional[str] = None,
+             min_rating: Optional[float] = None, has_phone: bool = False,
+             sort: Optional[str] = None) -> List[Company]:
+        """
+        Страница результатов (с фильтрами — только подходящие строки).
+        sort — ключ из _SORT_COLUMNS, '-' в начале — по убыванию; без него — в порядке добавления.
+        """
+        where, params = self._where(city, min_rating, has_phone)
+        sql = (f"SELECT {', '.join(_FIELDS)} FROM companies{where} "
+               f"ORDER BY {self._order_by(sort)} LIMIT ? OFFSET ?")
+        params += [max(0, limit), max(0, offset)]
+        with self._lock:
+            if self._conn is None:
+                return []
+            rows = self._conn.execute(sql, params).fetchall()
+        return [Company(**dict(zip(_FIELDS, r))) for r in rows]
+
+    def iter_companies(self, batch_size: int = 1000) -> Iterator[Company]:
+        """Все компании по порядку, порциями — для потокового экспорта"""
+        last_id = 0
+        while True:
+            with self._lock:
+                if self._conn is None:
+                    raise RuntimeError("Хранилище результатов закрыто (новый поиск или сброс)")
+                rows = self._conn.execute(
+                    f"SELECT id, {', '.join(_FIELDS)} FROM companies WHERE id > ? ORDER BY id LIMIT ?",
+                    (last_id, batch_size)
+                ).fetchall()
+            if not rows:
+                return
+            for r in rows:
+                yield Company(**dict(zip(_FIELDS, r[1:])))
+            last_id = rows[-1][0]
+
+    def acquire(self):
+        """Удерживать хранилище открытым до release() (для фонового чтения)"""
+        with self._lock:
+            if self._conn is None or self._closing:
+                raise RuntimeError("Хранилище результатов закрыто (новый поиск или сброс)")
+            self._readers += 1
+
+    def release(self):
+        with self._lock:
+            self._readers -= 1
+            deferred = self._closing and not self._readers
+        if deferred:
+            self._close_now()
+
+    def close(self):
+        with self._lock:
+            if self._conn is None:
+                return
+            if self._readers:
+                # Закроется, когда последний читатель вызовет release()
+                self._closing = True
+                return
+        self._close_now()
+
+    def _close_now(self):
+        with self._lock:
+            if self._conn is None:
+                return
+            self._conn.close()
+            self._conn = None
+        if self._owns_file:
+            for suffix in ('', '-wal', '-shm'):
+                try:
+                    os.remove(self.path + suffix)
+                except OSError:
+                    pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
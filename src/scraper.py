@@ -2,20 +2,26 @@
 Веб-скрапер для извлечения данных о компаниях с сайта 2GIS.
 Использует пагинацию и парсинг из списка результатов (без посещения страниц компаний).
 """
+import math
+import os
 import time
 import re
 import logging
-from typing import List, Optional
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterator, List, Optional, Tuple
 from urllib.parse import quote, urljoin
 
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
 from bs4 import BeautifulSoup
-from webdriver_manager.chrome import ChromeDriverManager
-
+from bs4.element import CData, NavigableString, Tag
+
+from .card_cache import CardCache
+from .cities import CITY_REGISTRY
+from .config import DEFAULT_PAGE_WORKERS, RESULTS_PER_PAGE
+from .dedup import FirmIndex
+from .snapshot import RefreshSession
+from .watchdog import WatchdogLimits, WatchedDriver
 from .models import Company
 
 logger = logging.getLogger(__name__)
@@ -31,13 +37,75 @@ class TwoGISScraper:
     }
     BASE_URL = "https://2gis.ru"
     PAGE_DELAY = 2
-
-    def __init__(self, headless: bool = True):
+    # Паузы на отрисовку страниц и между запросами телефонов (сек)
+    RENDER_WAIT = 3
+    FIRM_RENDER_WAIT = 2
+    PHONE_DELAY = 1
+    CAPTCHA_RETRIES = 2
+    CAPTCHA_BACKOFF = 30
+    ERROR_RETRIES = 3
+    ERROR_BACKOFF = 5
+    # Перезапуск браузера: после N страниц, при разросшейся памяти или деградации навигации
+    DRIVER_MAX_PAGES = 150
+    DRIVER_MAX_RSS_MB = 1500
+    DRIVER_LATENCY_FACTOR = 3.0
+    DRIVER_RSS_EVERY = 10
+    RESULTS_PER_PAGE = RESULTS_PER_PAGE
+    MAX_PAGES = 200
+    PAGE_WORKERS = DEFAULT_PAGE_WORKERS
+
+    # Счётчик результатов в шапке выдачи: «Места 1 234», «Организации 56»
+    # (только группы разрядов: «Места 56» перед фирмой «7 Пятниц» — это 56, а не 567)
+    _TOTAL_COUNT_RE = re.compile(r'(?:Места|Организации|Компании)\s*(\d{1,3}(?:[\s\u00a0]\d{3})*|\d{4,})\b', re.I)
+    _PAGE_LINK_RE = re.compile(r'/page/(\d+)')
+    # Только явные признаки 404: «Ничего не найдено» — это пустая выдача у рабочего slug-а,
+    # а неверный slug кэшируется на диске и больше не пробуется
+    # (только в <title>: «Страница не найдена» может оказаться в тексте карточки или скрипте)
+    _NOT_FOUND_RE = re.compile(
+        r'<title>[^<]*(?:(?:Ошибка|Error)\s*404|404\s*(?:Not Found|[—–:-]\s*(?:страница|page))'
+        r'|Страница не найдена|Page not found)', re.I)
+    _CAPTCHA_RE = re.compile(r'<title>[^<]*captcha|не робот', re.I)
+    # Ответ 5xx или страница сетевой ошибки Chrome — повторить, а не считать концом выдачи
+    _ERROR_PAGE_RE = re.compile(
+        r'<title>[^<]*(?:(?:Ошибка|Error)\s*5\d\d|5\d\d\s+(?:Internal Server Error|Bad Gateway|'
+        r'Service Unavailable|Gateway Time-?out))|id="main-frame-error"', re.I)
+
+    def __init__(self, headless: bool = True, page_workers: int = PAGE_WORKERS, base_url: Optional[str] = None,
+                 card_cache: Optional[CardCache] = None):
+        """
+        base_url — подменить домены 2GIS одним адресом (например, локальный тестовый сервер);
+        по умолчанию берётся из переменной окружения TWOGIS_BASE_URL.
+        card_cache — кэш разобранных карточек, общий для нескольких скраперов (по умолчанию свой, в памяти).
+        """
         self.headless = headless
+        self.page_workers = max(1, page_workers)
+        self.base_url = (base_url or os.environ.get('TWOGIS_BASE_URL') or '').rstrip('/') or None
+        self._owns_card_cache = card_cache is None
+        self.card_cache = card_cache if card_cache is not None else CardCache()
         self.driver = None
+        self._page_drivers = []
+        self._page_drivers_lock = threading.Lock()
         self._setup_driver()
 
     def _setup_driver(self):
+        self.driver = self._watched_driver('main')
+
+    def _watched_driver(self, name: str) -> WatchedDriver:
+        limits = WatchdogLimits(
+            max_pages=self.DRIVER_MAX_PAGES,
+            max_rss_mb=self.DRIVER_MAX_RSS_MB,
+            latency_factor=self.DRIVER_LATENCY_FACTOR,
+            rss_every=self.DRIVER_RSS_EVERY,
+        )
+        return WatchedDriver(self._create_driver, limits, name=name)
+
+    def _create_driver(self):
+        # selenium и webdriver_manager импортируются только при запуске браузера
+        from selenium import webdriver
+        from selenium.webdriver.chrome.service import Service
+        from selenium.webdriver.chrome.options import Options
+        from webdriver_manager.chrome import ChromeDriverManager
+
         chrome_options = Options()
         if self.headless:
             chrome_options.add_argument('--headless')
@@ -46,37 +114,36 @@ class TwoGISScraper:
         chrome_options.add_argument('--disable-blink-features=AutomationControlled')
         chrome_options.add_argument('user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
         service = Service(ChromeDriverManager().install())
-        self.driver = webdriver.Chrome(service=service, options=chrome_options)
-        self.driver.implicitly_wait(10)
-
-    def _normalize_city(self, city: str) -> str:
-        city_mapping = {
-            'москва': 'moscow', 'санкт-петербург': 'spb', 'спб': 'spb',
-            'екатеринбург': 'ekb', 'новосибирск': 'novosibirsk', 'казань': 'kazan',
-            'нижний новгород': 'nizhniy_novgorod', 'челябинск': 'chelyabinsk',
-            'самара': 'samara', 'омск': 'omsk', 'ростов-на-дону': 'rostov_na_donu',
-            'уфа': 'ufa', 'красноярск': 'krasnoyarsk', 'воронеж': 'voronezh',
-            'пермь': 'perm', 'волгоград': 'volgograd', 'краснодар': 'krasnodar',
-            'алматы': 'almaty', 'астана': 'astana', 'нур-султан': 'astana',
-            'шымкент': 'shymkent', 'ташкент': 'tashkent', 'самарканд': 'samarkand',
-            'усть-каменогорск': 'ust_kamenogorsk', 'петропавловск': 'petropavl',
-            'кокшетау': 'kokchetav', 'талдыкорган': 'taldykorgan', 'атырау': 'atyrau',
-        }
-        city_lower = city.lower().strip()
-        if city_lower in city_mapping:
-            return city_mapping[city_lower]
-        translit_map = {
-            'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'yo',
-            'ж': 'zh', 'з': 'z', 'и': 'i', 'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm',
-            'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u',
-            'ф': 'f', 'х': 'h', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'sch',
-            'ъ': '', 'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya'
-        }
-        return ''.join(translit_map.get(c, c) if c.isalpha() else ('_' if c in ' -' else c) for c in city_lower)
-
-    def _build_search_url(self, city: str, category: Optional[str] = None, country: Optional[str] = None, page: int = 1) -> str:
-        base = self.COUNTRY_DOMAINS.get(country or 'Россия', self.BASE_URL)
-        city_norm = self._normalize_city(city)
+        driver = webdriver.Chrome(service=service, options=chrome_options)
+        driver.implicitly_wait(10)
+        return driver
+
+    def _wait_ready(self, driver, timeout: int):
+        """Ожидание document.readyState == 'complete'"""
+        from selenium.webdriver.support.ui import WebDriverWait
+        WebDriverWait(driver, timeout).until(
+            lambda d: d.execute_script('return document.readyState') == 'complete'
+        )
+
+    def _get_page_drivers(self, count: int) -> list:
+        """Дополнительные драйверы для параллельной загрузки страниц (создаются по требованию)"""
+        with self._page_drivers_lock:
+            while len(self._page_drivers) < count:
+                self._page_drivers.append(self._watched_driver(f'page-{len(self._page_drivers) + 1}'))
+            return self._page_drivers[:count]
+
+    def _base_url(self, country: Optional[str] = None) -> str:
+        if self.base_url:
+            return self.base_url
+        return self.COUNTRY_DOMAINS.get(country or 'Россия', self.BASE_URL)
+
+    def _normalize_city(self, city: str, country: Optional[str] = None) -> str:
+        return CITY_REGISTRY.slug(city, country)
+
+    def _build_search_url(self, city: str, category: Optional[str] = None, country: Optional[str] = None, page: int = 1,
+                          city_slug: Optional[str] = None) -> str:
+        base = self._base_url(country)
+        city_norm = city_slug or self._normalize_city(city, country)
         if category:
             cat_enc = quote(category.lower())
             path = f"/{city_norm}/search/{cat_enc}"
@@ -86,6 +153,26 @@ class TwoGISScraper:
             path += f"/page/{page}"
         return base + path
 
+    def _is_not_found(self, html: str) -> bool:
+        """Страница 404 (неизвестный slug города)"""
+        return bool(self._NOT_FOUND_RE.search(html))
+
+    def _load_first_page(self, city: str, category: Optional[str], country: Optional[str],
+                         page: int = 1) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Первая загружаемая страница выдачи (page) и рабочий slug города. Slug-и пробуются
+        по порядку из реестра; результат проверки (рабочий slug или 404) сохраняется в кэш реестра.
+        (None, None) — ни один slug не подошёл.
+        """
+        for slug in CITY_REGISTRY.candidates(city, country):
+            html = self._load_page(self.driver, self._build_search_url(city, category, country, page, city_slug=slug))
+            if self._is_not_found(html):
+                CITY_REGISTRY.mark_invalid(city, country, slug)
+                continue
+            CITY_REGISTRY.mark_verified(city, country, slug)
+            return html, slug
+        return None, None
+
     def _find_phone_card(self, link) -> Optional[object]:
         """Найти наименьший контейнер с одной фирмой (избежать телефонов из соседних карточек)"""
         p = link.find_parent()
@@ -114,12 +201,8 @@ class TwoGISScraper:
     def _fetch_phone_from_firm_page(self, firm_url: str) -> Optional[str]:
         """Загрузка страницы фирмы и извлечение телефона"""
         try:
-            self.driver.get(firm_url.split('?')[0])
-            WebDriverWait(self.driver, 15).until(
-                lambda d: d.execute_script('return document.readyState') == 'complete'
-            )
-            time.sleep(2)
-            html = self.driver.page_source
+            html = self._load_page(self.driver, firm_url.split('?')[0], timeout=15,
+                                   render_wait=self.FIRM_RENDER_WAIT)
             soup = BeautifulSoup(html, 'lxml')
             phones = []
             seen = set()
@@ -147,56 +230,142 @@ class TwoGISScraper:
     _ADDR_KEYWORDS = r'(?:улица|ул\.|пр\.|бульвар|переулок|площадь|проспект|шоссе|м\.|метро|д\.|дом|корп\.|стр\.|г\.)'
     _ADDR_RE = re.compile(_ADDR_KEYWORDS, re.I)
     _DESC_KEYWORDS = r'(?:услуги|работаем|предлагаем|компания|салон|магазин|кафе|ресторан)'
+    _DESC_RE = re.compile(_DESC_KEYWORDS, re.I)
+    _ADDR_IN_TEXT_RE = re.compile(rf'({_ADDR_KEYWORDS}[^.]{{5,150}})', re.I)
+    _STREET_IN_TEXT_RE = re.compile(r'([^,]{5,120}(?:улица|ул\.|пр\.|бульвар|переулок|площадь|проспект|шоссе)[^,]{0,80})', re.I)
+    _ADDR_IN_INFO_RE = re.compile(rf'({_ADDR_KEYWORDS}[^.]{{5,200}})', re.I)
+    _DESC_SPLIT_RE = re.compile(rf'\.\s*(?:{_DESC_KEYWORDS})', re.I)
+    _RATING_PREFIX_RE = re.compile(r'^\d+[.,]\d+')
+    _DIGIT_PREFIX_RE = re.compile(r'^\d+')
+    # Селекторы по приоритету (как у select_one): data-testid, класс, подстрока класса, href
+    _ADDRESS_SELECTORS = (('testid', 'address'), ('class', 'address'), ('class*', 'address'),
+                          ('class*', 'Address'), ('geo', 'geo:'))
+    _DESCRIPTION_SELECTORS = (('testid', 'description'), ('class', 'description'), ('class*', 'description'),
+                              ('class*', 'snippet'), ('class*', 'Snippet'))
+    _TEXT_TYPES = (NavigableString, CData)
+    # Теги со своим типом строк (Script, Stylesheet...): их текст — только через get_text()
+    _OWN_STRING_TAGS = frozenset(('script', 'style', 'template', 'rt', 'rp'))
+
+    @staticmethod
+    def _matches_selector(kind: str, value: str, tag) -> bool:
+        attrs = tag.attrs
+        if kind == 'testid':
+            return attrs.get('data-testid') == value
+        if kind == 'geo':
+            href = attrs.get('href')
+            return tag.name == 'a' and isinstance(href, str) and href.startswith(value)
+        classes = attrs.get('class')
+        if not classes:
+            return False
+        if isinstance(classes, str):
+            classes = classes.split()
+        return value in classes if kind == 'class' else value in ' '.join(classes)
+
+    def _card_elements(self, card) -> Tuple[list, list, dict]:
+        """
+        Один обход карточки: текстовые узлы (как их видит get_text(strip=True)), элементы
+        в порядке документа с диапазонами своих узлов и первые элементы под каждый селектор.
+        """
+        texts = []
+        elements = []  # [tag, начало, конец]
+        selected = {}
+        selectors = self._ADDRESS_SELECTORS + self._DESCRIPTION_SELECTORS
+        text_types = self._TEXT_TYPES
+        stack = [iter(card.children)]
+        open_elements = []
+        while stack:
+            child = next(stack[-1], None)
+            if child is None:
+                stack.pop()
+                if open_elements:
+                    open_elements.pop()[2] = len(texts)
+                continue
+            if type(child) in text_types:
+                t = child.strip()
+                if t:
+                    texts.append(t)
+            elif isinstance(child, Tag):
+                entry = [child, len(texts), len(texts)]
+                elements.append(entry)
+                if len(selected) < len(selectors):
+                    for sel in selectors:
+                        if sel not in selected and self._matches_selector(sel[0], sel[1], child):
+                            selected[sel] = len(elements) - 1
+                open_elements.append(entry)
+                stack.append(iter(child.children))
+        return texts, elements, selected
 
     def _extract_address_and_info(self, card, card_text: str, name: str) -> tuple:
         """
         Извлечение адреса и описания из карточки. Гарантирует: адрес не попадает в info.
+        Карточка обходится один раз (_card_elements); тексты элементов и проверка на
+        адресные слова вычисляются по требованию и кэшируются.
         Возвращает (address, info).
         """
         address = None
         info = None
+        texts, elements, selected = self._card_elements(card)
+        text_cache = {}
+        addr_cache = {}
+        own_string_tags = self._OWN_STRING_TAGS
+
+        def text(idx: int) -> str:
+            t = text_cache.get(idx)
+            if t is None:
+                tag, begin, end = elements[idx]
+                if tag.name in own_string_tags:
+                    t = tag.get_text(strip=True)
+                else:
+                    t = ''.join(texts[begin:end])
+                text_cache[idx] = t
+            return t
+
+        def has_addr(idx: int) -> bool:
+            flag = addr_cache.get(idx)
+            if flag is None:
+                flag = addr_cache[idx] = self._ADDR_RE.search(text(idx)) is not None
+            return flag
 
         # 1. Адрес: селекторы
-        for sel in ['[data-testid="address"]', '.address', '[class*="address"]', '[class*="Address"]', 'a[href^="geo:"]']:
-            el = card.select_one(sel)
-            if el:
-                t = el.get_text(strip=True)
-                if 5 < len(t) < 250 and self._ADDR_RE.search(t):
+        for sel in self._ADDRESS_SELECTORS:
+            idx = selected.get(sel)
+            if idx is not None:
+                t = text(idx)
+                if 5 < len(t) < 250 and has_addr(idx):
                     address = t[:250]
                     break
 
         # 2. Адрес: элементы с адресоподобным текстом (без описания)
         if not address:
-            for el in card.find_all(['span', 'div', 'p', 'a']):
-                t = el.get_text(strip=True)
-                if 8 < len(t) < 220 and self._ADDR_RE.search(t) and not re.search(self._DESC_KEYWORDS, t, re.I):
+            for idx, (tag, _, _) in enumerate(elements):
+                if tag.name not in ('span', 'div', 'p', 'a'):
+                    continue
+                t = text(idx)
+                if 8 < len(t) < 220 and has_addr(idx) and not self._DESC_RE.search(t):
                     address = t[:250]
                     break
 
         # 3. Адрес: regex по card_text (адрес в начале или с городом)
         if not address:
-            for pat in [
-                rf'({self._ADDR_KEYWORDS}[^.]{{5,150}})',
-                r'([^,]{5,120}(?:улица|ул\.|пр\.|бульвар|переулок|площадь|проспект|шоссе)[^,]{0,80})',
-            ]:
-                m = re.search(pat, card_text, re.I)
+            for pat in (self._ADDR_IN_TEXT_RE, self._STREET_IN_TEXT_RE):
+                m = pat.search(card_text)
                 if m:
                     address = m.group(1).strip()[:250]
                     break
 
         # 4. Info: только описание (без адреса)
-        for sel in ['[data-testid="description"]', '.description', '[class*="description"]', '[class*="snippet"]', '[class*="Snippet"]']:
-            el = card.select_one(sel)
-            if el:
-                txt = el.get_text(strip=True)
-                if 20 < len(txt) < 800 and txt != name and not re.match(r'^\d+[.,]\d+', txt):
-                    if not self._ADDR_RE.search(txt):
+        for sel in self._DESCRIPTION_SELECTORS:
+            idx = selected.get(sel)
+            if idx is not None:
+                txt = text(idx)
+                if 20 < len(txt) < 800 and txt != name and not self._RATING_PREFIX_RE.match(txt):
+                    if not has_addr(idx):
                         info = txt[:500]
                         break
                     # Блок содержит адрес (и возможно описание)
                     if not address and 8 < len(txt) < 250:
                         address = txt[:250]
-                    split_m = re.search(rf'\.\s*(?:{self._DESC_KEYWORDS})', txt, re.I)
+                    split_m = self._DESC_SPLIT_RE.search(txt)
                     if split_m:
                         addr_part = txt[:split_m.start()].strip()
                         desc_part = txt[split_m.start():].lstrip('. ')
@@ -209,19 +378,21 @@ class TwoGISScraper:
 
         # 5. Info: fallback — элементы без адреса
         if not info:
-            for el in card.find_all(['span', 'div', 'p']):
-                t = el.get_text(strip=True)
+            for idx, (tag, _, _) in enumerate(elements):
+                if tag.name not in ('span', 'div', 'p'):
+                    continue
+                t = text(idx)
                 if 25 < len(t) < 600 and t != name and t != address:
-                    if not re.match(r'^\d+', t) and 'оценок' not in t.lower() and not self._ADDR_RE.search(t):
+                    if not self._DIGIT_PREFIX_RE.match(t) and 'оценок' not in t.lower() and not has_addr(idx):
                         info = t[:500]
                         break
 
         # 6. Финальная очистка: адрес в info — переносим в address и удаляем из info
         if info and not address:
-            m = re.search(rf'({self._ADDR_KEYWORDS}[^.]{{5,200}})', info, re.I)
+            m = self._ADDR_IN_INFO_RE.search(info)
             if m:
                 address = m.group(1).strip()[:250]
-                info = re.sub(re.escape(address), '', info, count=1).strip()
+                info = info.replace(address, '', 1).strip()
         if info and address and address in info:
             info = info.replace(address, '', 1).strip()
 
@@ -268,6 +439,14 @@ class TwoGISScraper:
                     card = p
                     break
                 card = p
+
+            # Карточка уже разбиралась (соседняя категория, повторный запуск) — поля из кэша
+            cache_key = self.card_cache.key(href, card)
+            cached = self.card_cache.get(cache_key)
+            if cached is not None:
+                companies.append(Company(url=full_url, **cached))
+                continue
+
             card_text = card.get_text(separator=' ', strip=True) if card else ''
 
             phone_card = self._find_phone_card(link)
@@ -295,7 +474,7 @@ class TwoGISScraper:
 
             addr_val, info_val = self._extract_address_and_info(card, card_text, name)
 
-            companies.append(Company(
+            company = Company(
                 name=name,
                 phone=phone,
                 address=addr_val,
@@ -303,63 +482,251 @@ class TwoGISScraper:
                 rating=rating,
                 voters_count=voters_count,
                 url=full_url
-            ))
+            )
+            self.card_cache.put(cache_key, company)
+            companies.append(company)
 
         return companies
 
+    def _parse_total_count(self, html: str) -> Optional[int]:
+        """Общее количество результатов из шапки первой страницы поиска"""
+        text = BeautifulSoup(html, 'lxml').get_text(separator=' ', strip=True)
+        m = self._TOTAL_COUNT_RE.search(text)
+        if not m:
+            return None
+        digits = re.sub(r'\D', '', m.group(1))
+        return int(digits) if digits else None
+
+    def _has_next_page(self, html: str, page: int) -> bool:
+        return f'/page/{page + 1}' in html
+
+    def _max_linked_page(self, html: str) -> int:
+        """Наибольший номер страницы в ссылках пагинации (1 — ссылок нет)"""
+        return max((int(n) for n in self._PAGE_LINK_RE.findall(html)), default=1)
+
+    def _load_page(self, driver: WatchedDriver, url: str, timeout: int = 20,
+                   render_wait: Optional[float] = None) -> str:
+        """
+        Загрузка страницы (поиска или фирмы) и ожидание полной отрисовки. При капче и ошибке сервера —
+        пауза и повтор; при падении браузера страница повторяется на перезапущенном (см. WatchedDriver).
+        """
+        captchas = errors = 0
+        while True:
+            driver.navigate(url, lambda d: self._wait_ready(d, timeout))
+            time.sleep(self.RENDER_WAIT if render_wait is None else render_wait)
+            html = driver.page_source
+            if self._CAPTCHA_RE.search(html):
+                captchas += 1
+                if captchas > self.CAPTCHA_RETRIES:
+                    raise RuntimeError(f"Капча не пропускает: {url}")
+                logger.warning(f"Капча на {url} (попытка {captchas}), пауза {self.CAPTCHA_BACKOFF} сек")
+                time.sleep(self.CAPTCHA_BACKOFF * captchas)
+            elif self._ERROR_PAGE_RE.search(html):
+                errors += 1
+                if errors > self.ERROR_RETRIES:
+                    raise RuntimeError(f"Ошибка сервера не проходит: {url}")
+                logger.warning(f"Ошибка сервера на {url} (попытка {errors}), пауза {self.ERROR_BACKOFF} сек")
+                time.sleep(self.ERROR_BACKOFF * errors)
+            else:
+                return html
+
+    def _page_expected(self, page: int, total_pages: Optional[int], prev_html: Optional[str]) -> bool:
+        """Страница должна быть непустой: она раньше последней по счётчику или на неё ссылается предыдущая"""
+        if total_pages and page < total_pages:
+            return True
+        return prev_html is not None and self._has_next_page(prev_html, page - 1)
+
+    def _reload_listing_page(self, city: str, category: Optional[str], country: Optional[str], page: int,
+                             city_slug: Optional[str], base_url: str) -> Tuple[str, List[Company]]:
+        """Повторная загрузка пустой страницы посреди выдачи; снова пусто — ошибка, а не конец списка"""
+        logger.warning(f"{city}: пустая страница {page} посреди выдачи, повторная загрузка")
+        html = self._load_page(self.driver, self._build_search_url(city, category, country, page, city_slug))
+        companies = self._parse_search_page(html, base_url)
+        if not companies:
+            raise RuntimeError(f"{city}: страница {page} пуста, хотя выдача продолжается")
+        return html, companies
+
+    def _iter_search_pages(self, first_html: str, city: str, category: Optional[str],
+                           country: Optional[str], total_pages: Optional[int],
+                           first_page: int = 1, last_page: Optional[int] = None,
+                           city_slug: Optional[str] = None) -> Iterator[Tuple[int, str]]:
+        """
+        Страницы выдачи по порядку, начиная с уже загруженной first_page. Если число страниц
+        известно — остальные страницы грузятся параллельно на нескольких драйверах
+        (не больше page_workers одновременно). Иначе — последовательно по ссылке на следующую.
+        """
+        yield first_page, first_html
+
+        if total_pages is None:
+            page, html = first_page, first_html
+            last = min(last_page or self.MAX_PAGES, self.MAX_PAGES)
+            while page < last and self._has_next_page(html, page):
+                page += 1
+                time.sleep(self.PAGE_DELAY)
+                html = self._load_page(self.driver, self._build_search_url(city, category, country, page, city_slug))
+                yield page, html
+            return
+
+        last = min(total_pages, last_page) if last_page else total_pages
+        if last <= first_page:
+            return
+
+        workers = min(self.page_workers, last - first_page)
+        if workers == 1:
+            # Параллелить нечего — страницы по очереди на основном драйвере, без второго браузера
+            for page in range(first_page + 1, last + 1):
+                time.sleep(self.PAGE_DELAY)
+                yield page, self._load_page(self.driver, self._build_search_url(city, category, country, page, city_slug))
+            return
+
+        drivers = queue.Queue()
+        for d in self._get_page_drivers(workers):
+            drivers.put(d)
+        stop = threading.Event()
+
+        def fetch(page: int) -> Optional[str]:
+            if stop.is_set():
+                return None
+            driver = drivers.get()
+            try:
+                return self._load_page(driver, self._build_search_url(city, category, country, page, city_slug))
+            finally:
+                time.sleep(self.PAGE_DELAY)
+                drivers.put(driver)
+
+        pages = iter(range(first_page + 1, last + 1))
+        pending = []
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='2gis-page') as pool:
+            try:
+                for page in pages:
+                    pending.append((page, pool.submit(fetch, page)))
+                    if len(pending) >= workers:
+                        break
+                while pending:
+                    page, future = pending.pop(0)
+                    html = future.result()
+                    next_page = next(pages, None)
+                    if next_page is not None:
+                        pending.append((next_page, pool.submit(fetch, next_page)))
+                    if html is not None:
+                        yield page, html
+            finally:
+                stop.set()
+                for _, future in pending:
+                    future.cancel()
+
+    def _detect_total_pages(self, first_html: str) -> Tuple[Optional[int], Optional[int]]:
+        """(число результатов, число страниц) по первой странице; (None, None) — неизвестно"""
+        total_count = self._parse_total_count(first_html)
+        if not total_count:
+            return None, None
+        total_pages = min(math.ceil(total_count / self.RESULTS_PER_PAGE), self.MAX_PAGES)
+        linked = self._max_linked_page(first_html)
+        if total_pages < linked or (total_pages > 1) != self._has_next_page(first_html, 1):
+            # Счётчик не сходится с пагинацией (страниц меньше, чем в ссылках, или есть/нет
+            # ссылки на вторую страницу вопреки счётчику) — не доверяем ему
+            logger.warning(f"Счётчик {total_count} не сходится с пагинацией (ссылки до стр. {linked})")
+            return None, None
+        return total_count, total_pages
+
+    def _collect_page(self, companies: List[Company], city: str, seen: FirmIndex,
+                      collected: Optional[List[Company]], found: int = 0,
+                      max_results: Optional[int] = None, progress_callback=None, total: int = 0,
+                      result_callback: Optional[Callable[[Company], None]] = None,
+                      refresh: Optional[RefreshSession] = None) -> Tuple[int, bool]:
+        """
+        Новые компании страницы: дедупликация, загрузка телефона, добавление в collected
+        (None — не копить: компании только уходят в result_callback).
+        found — собрано до этой страницы. Возвращает (собрано всего, достигнут ли max_results).
+        """
+        for c in companies:
+            if c.url and seen.add(c):
+                if not c.phone and c.url:
+                    if progress_callback:
+                        progress_callback(found, total, f'Загрузка телефона: {c.name[:40]}...')
+                    c.phone = self._fetch_phone_from_firm_page(c.url)
+                    time.sleep(self.PHONE_DELAY)
+                c.city = city
+                found += 1
+                if collected is not None:
+                    collected.append(c)
+                if refresh is not None:
+                    refresh.record(c)
+                if result_callback:
+                    result_callback(c)
+                if max_results and found >= max_results:
+                    return found, True
+        return found, False
+
     def search_companies(self, city: str, category: Optional[str] = None,
                          max_results: Optional[int] = None,
                          progress_callback=None,
-                         country: Optional[str] = None) -> List[Company]:
-        base_url = self.COUNTRY_DOMAINS.get(country or 'Россия', self.BASE_URL)
+                         country: Optional[str] = None,
+                         firm_index: Optional[FirmIndex] = None,
+                         result_callback: Optional[Callable[[Company], None]] = None,
+                         refresh: Optional[RefreshSession] = None) -> List[Company]:
+        """
+        Поиск компаний города. firm_index — общий индекс дедупликации (между городами,
+        заданиями и запусками): уже встреченные фирмы пропускаются до загрузки телефона.
+        result_callback вызывается для каждой новой компании сразу после обработки; с ним
+        компании в памяти не копятся и возвращается пустой список.
+        refresh — сессия обновления по снимку прошлого запуска: телефоны загружаются
+        только для новых и изменившихся карточек.
+        """
+        base_url = self._base_url(country)
         all_companies = []
-        page = 1
-        max_pages = 200
+        keep = result_callback is None
+        found = 0
+        seen = firm_index if firm_index is not None else FirmIndex()
+        total = max_results or 0
 
         try:
-            while page <= max_pages:
-                url = self._build_search_url(city, category, country, page)
+            if progress_callback:
+                progress_callback(0, total, 'Загрузка страницы 1...')
+            first_html, city_slug = self._load_first_page(city, category, country)
+            if first_html is None:
+                logger.warning(f"Город {city} ({country or 'Россия'}) не найден на 2GIS")
                 if progress_callback:
-                    progress_callback(len(all_companies), 0, f'Загрузка страницы {page}...')
-
-                self.driver.get(url)
-                WebDriverWait(self.driver, 20).until(
-                    lambda d: d.execute_script('return document.readyState') == 'complete'
-                )
-                time.sleep(3)
-
-                html = self.driver.page_source
-                companies = self._parse_search_page(html, base_url)
-
-                if not companies:
-                    break
-
-                for c in companies:
-                    if c.url and not any(x.url == c.url for x in all_companies):
-                        if not c.phone and c.url:
-                            if progress_callback:
-                                progress_callback(len(all_companies), max_results or 0, f'Загрузка телефона: {c.name[:40]}...')
-                            c.phone = self._fetch_phone_from_firm_page(c.url)
-                            time.sleep(1)
-                        c.city = city
-                        all_companies.append(c)
-                        if max_results and len(all_companies) >= max_results:
-                            break
-
-                if max_results and len(all_companies) >= max_results:
-                    all_companies = all_companies[:max_results]
-                    break
-
-                has_next = bool(self.driver.find_elements(By.CSS_SELECTOR, f'a[href*="/page/{page + 1}"]'))
-                if not has_next:
-                    break
-
-                page += 1
-                time.sleep(self.PAGE_DELAY)
+                    progress_callback(0, 0, f'Город {city} не найден на 2GIS')
+                return all_companies
+
+            total_count, total_pages = self._detect_total_pages(first_html)
+            if total_count:
+                total = min(max_results, total_count) if max_results else total_count
+                logger.info(f"Результатов: {total_count}, страниц: {total_pages}")
+
+            pages = self._iter_search_pages(first_html, city, category, country, total_pages, city_slug=city_slug)
+            prev_html = None
+            try:
+                for page, html in pages:
+                    if progress_callback:
+                        pages_label = f'{page}/{total_pages}' if total_pages else str(page)
+                        progress_callback(found, total, f'Обработка страницы {pages_label}...')
+                    companies = self._parse_search_page(html, base_url)
+                    if not companies and self._page_expected(page, total_pages, prev_html):
+                        html, companies = self._reload_listing_page(city, category, country, page, city_slug, base_url)
+                    prev_html = html
+
+                    if not companies:
+                        break
+                    if refresh is not None and refresh.observe_page(page, companies):
+                        logger.info(f"Страница {page} не изменилась с прошлого запуска")
+
+                    found, reached = self._collect_page(
+                        companies, city, seen, all_companies if keep else None, found, max_results,
+                        progress_callback, total, result_callback, refresh
+                    )
+                    if reached:
+                        break
+                else:
+                    if refresh is not None:
+                        refresh.mark_complete()
+            finally:
+                pages.close()
 
             if progress_callback:
-                progress_callback(len(all_companies), len(all_companies), f'Найдено {len(all_companies)} компаний')
-            logger.info(f"Найдено компаний: {len(all_companies)}")
+                progress_callback(found, found, f'Найдено {found} компаний')
+            logger.info(f"Найдено компаний: {found}")
             return all_companies
 
         except Exception as e:
@@ -368,9 +735,75 @@ class TwoGISScraper:
                 progress_callback(0, 0, str(e))
             return all_companies
 
+    def search_pages(self, city: str, category: Optional[str], country: Optional[str],
+                     page_start: int, page_end: int, firm_index: Optional[FirmIndex] = None,
+                     city_slug: Optional[str] = None) -> Tuple[List[Company], Optional[int], bool, Optional[str]]:
+        """
+        Диапазон страниц выдачи page_start..page_end (задание распределённого обхода).
+        city_slug — slug, подтверждённый на первой странице (у воркера на другой машине
+        кэш slug-ов может быть пуст); без него slug-и перебираются, как для первой страницы.
+        Возвращает (компании, число страниц — если известно по первой странице,
+        есть ли страницы дальше, рабочий slug).
+        В отличие от search_companies ошибки не глушатся — задание будет повторено.
+        """
+        base_url = self._base_url(country)
+        seen = firm_index if firm_index is not None else FirmIndex()
+        collected = []
+
+        total_pages = None
+        if page_start == 1:
+            first_html, city_slug = self._load_first_page(city, category, country)
+            if first_html is None:
+                logger.warning(f"Город {city} ({country or 'Россия'}) не найден на 2GIS")
+                return collected, 0, False, None
+            _, total_pages = self._detect_total_pages(first_html)
+            fan_out_to = total_pages
+        else:
+            if city_slug:
+                first_html = self._load_page(
+                    self.driver, self._build_search_url(city, category, country, page_start, city_slug)
+                )
+                if self._is_not_found(first_html):
+                    first_html = None
+            else:
+                first_html, city_slug = self._load_first_page(city, category, country, page_start)
+            if first_html is None:
+                # Первая страница города находилась — 404 здесь ошибка, а не конец выдачи
+                raise RuntimeError(f"Город {city}: страница {page_start} не найдена (slug {city_slug or '?'})")
+            # Диапазон задан координатором — страницы внутри него можно грузить параллельно
+            fan_out_to = page_end
+
+        has_more = False
+        pages = self._iter_search_pages(first_html, city, category, country, fan_out_to,
+                                        first_page=page_start, last_page=page_end, city_slug=city_slug)
+        prev_html = None
+        try:
+            for page, html in pages:
+                companies = self._parse_search_page(html, base_url)
+                if not companies and self._page_expected(page, total_pages, prev_html):
+                    html, companies = self._reload_listing_page(city, category, country, page, city_slug, base_url)
+                prev_html = html
+                if not companies:
+                    break
+                self._collect_page(companies, city, seen, collected, len(collected))
+                has_more = page == page_end and self._has_next_page(html, page)
+        finally:
+            pages.close()
+
+        logger.info(f"{city}, страницы {page_start}-{page_end}: {len(collected)} компаний")
+        return collected, total_pages, has_more, city_slug
+
     def close(self):
+        for d in self._page_drivers:
+            try:
+                d.quit()
+            except Exception:
+                pass
+        self._page_drivers = []
         if self.driver:
             self.driver.quit()
+        if self._owns_card_cache:
+            self.card_cache.close()
 
     def __enter__(self):
         return self
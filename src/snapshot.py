@@ -0,0 +1,205 @@
+"""
+Снимок прошлой выгрузки для инкрементального обновления (SQLite).
+Для каждого запроса (страна, город, категория) хранятся отпечатки карточек и страниц выдачи:
+при повторном обходе телефоны загружаются только для новых и изменившихся фирм,
+а на выходе получается разница с прошлым запуском (новые / изменённые / исчезнувшие).
+"""
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional
+
+from .dedup import firm_key
+from .models import Company
+
+logger = logging.getLogger(__name__)
+
+NEW = 'new'
+CHANGED = 'changed'
+SAME = 'same'
+REMOVED = 'removed'
+
+
+def card_fingerprint(company: Company) -> str:
+    """Отпечаток карточки: название, адрес, рейтинг, число голосов"""
+    raw = '\x1f'.join(str(v) if v is not None else '' for v in (
+        (company.name or '').strip(), (company.address or '').strip(), company.rating, company.voters_count
+    ))
+    return hashlib.blake2b(raw.encode('utf-8'), digest_size=12).hexdigest()
+
+
+def page_fingerprint(fingerprints: List[str]) -> str:
+    return hashlib.blake2b('|'.join(fingerprints).encode('utf-8'), digest_size=12).hexdigest()
+
+
+@dataclass
+class RefreshDiff:
+    new: List[Company] = field(default_factory=list)
+    changed: List[Company] = field(default_factory=list)
+    removed: List[Company] = field(default_factory=list)
+
+    def extend(self, other: 'RefreshDiff'):
+        self.new.extend(other.new)
+        self.changed.extend(other.changed)
+        self.removed.extend(other.removed)
+
+    def __len__(self) -> int:
+        return len(self.new) + len(self.changed) + len(self.removed)
+
+
+@dataclass
+class RefreshStats:
+    pages: int = 0
+    pages_unchanged: int = 0
+    cards: int = 0
+    phones_reused: int = 0
+
+
+class Snapshot:
+    """Файл снимка. Один экземпляр на запуск; сессии обновления создаются через session()."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript('''
+            CREATE TABLE IF NOT EXISTS firms (
+                scope TEXT NOT NULL,
+                key TEXT NOT NULL,
+                fingerprint TEXT NOT NULL,
+                data TEXT NOT NULL,
+                PRIMARY KEY (scope, key)
+            );
+            CREATE TABLE IF NOT EXISTS pages (
+                scope TEXT NOT NULL,
+                page INTEGER NOT NULL,
+                fingerprint TEXT NOT NULL,
+                PRIMARY KEY (scope, page)
+            );
+        ''')
+        self._conn.commit()
+
+    @staticmethod
+    def scope(city: str, category: Optional[str], country: Optional[str]) -> str:
+        return f"{(country or 'Россия').lower()}|{city.strip().lower()}|{(category or '').strip().lower()}"
+
+    def session(self, city: str, category: Optional[str] = None, country: Optional[str] = None) -> 'RefreshSession':
+        scope = self.scope(city, category, country)
+        with self._lock:
+            firms = {
+                key: (fp, json.loads(data)) for key, fp, data in
+                self._conn.execute('SELECT key, fingerprint, data FROM firms WHERE scope = ?', (scope,))
+            }
+            pages = dict(self._conn.execute('SELECT page, fingerprint FROM pages WHERE scope = ?', (scope,)))
+        return RefreshSession(self, scope, firms, pages)
+
+    def _save(self, scope: str, firms: Dict[str, tuple], pages: Dict[int, str], removed: List[str]):
+        with self._lock:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO firms (scope, key, fingerprint, data) VALUES (?, ?, ?, ?)',
+                [(scope, key, fp, json.dumps(data, ensure_ascii=False)) for key, (fp, data) in firms.items()]
+            )
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO pages (scope, page, fingerprint) VALUES (?, ?, ?)',
+                [(scope, page, fp) for page, fp in pages.items()]
+            )
+            self._conn.executemany('DELETE FROM firms WHERE scope = ? AND key = ?', [(scope, k) for k in removed])
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class RefreshSession:
+    """
+    Обновление одного запроса. Скрапер вызывает observe_page() для каждой разобранной
+    страницы (до загрузки телефонов) и record() для каждой принятой компании;
+    finish() сохраняет снимок и возвращает разницу с прошлым запуском.
+    """
+
+    def __init__(self, snapshot: Snapshot, scope: str, firms: Dict[str, tuple], pages: Dict[int, str]):
+        self.snapshot = snapshot
+        self.scope = scope
+        self.stats = RefreshStats()
+        self.complete = False
+        self._previous = firms
+        self._previous_pages = pages
+        self._seen: Dict[str, tuple] = {}
+        self._pages: Dict[int, str] = {}
+        self._status: Dict[str, str] = {}
+        self._diff = RefreshDiff()
+
+    def observe_page(self, page: int, companies: List[Company]) -> bool:
+        """
+        Сверка страницы со снимком. Неизменившимся карточкам без телефона подставляется
+        телефон из снимка — скрапер не пойдёт за ним на страницу фирмы.
+        True — страница совпадает с прошлым запуском целиком.
+        """
+        fingerprints = [card_fingerprint(c) for c in companies]
+        page_fp = page_fingerprint(fingerprints)
+        unchanged = self._previous_pages.get(page) == page_fp
+        self._pages[page] = page_fp
+        self.stats.pages += 1
+        self.stats.pages_unchanged += unchanged
+        for c, fp in zip(companies, fingerprints):
+            key = firm_key(c)
+            if key is None:
+                continue
+            key = str(key)
+            self.stats.cards += 1
+            previous = self._previous.get(key)
+            if previous is None:
+                self._status[key] = NEW
+            elif previous[0] != fp:
+                self._status[key] = CHANGED
+            else:
+                self._status[key] = SAME
+                if not c.phone and previous[1].get('phone'):
+                    c.phone = previous[1]['phone']
+                    self.stats.phones_reused += 1
+            self._seen[key] = (fp, asdict(c))
+        return unchanged
+
+    def record(self, company: Company):
+        """Компания принята в выгрузку (после загрузки телефона)"""
+        key = firm_key(company)
+        if key is None:
+            return
+        key = str(key)
+        if key in self._seen:
+            self._seen[key] = (self._seen[key][0], asdict(company))
+        status = self._status.get(key)
+        if status == NEW:
+            self._diff.new.append(company)
+        elif status == CHANGED:
+            self._diff.changed.append(company)
+
+    def mark_complete(self):
+        """Выдача пройдена до конца — фирмы, которых в ней нет, считаются исчезнувшими"""
+        self.complete = True
+
+    def finish(self) -> RefreshDiff:
+        removed_keys = []
+        if self.complete:
+            removed_keys = [k for k in self._previous if k not in self._seen]
+            self._diff.removed = [Company(**self._previous[k][1]) for k in removed_keys]
+        self.snapshot._save(self.scope, self._seen, self._pages, removed_keys)
+        logger.info(
+            f"Обновление {self.scope}: новых {len(self._diff.new)}, изменённых {len(self._diff.changed)}, "
+            f"исчезнувших {len(self._diff.removed)}; страниц без изменений "
+            f"{self.stats.pages_unchanged}/{self.stats.pages}, телефонов из снимка {self.stats.phones_reused}"
+        )
+        return self._diff
@@ -0,0 +1,514 @@
+"""
+Очередь заданий распределённого обхода: (страна, город, категория, диапазон страниц).
+Воркеры берут задания в аренду (lease); просроченные и упавшие задания возвращаются
+в очередь, пока не исчерпан лимит попыток.
+
+Бэкенды: SQLiteTaskQueue (файл, по умолчанию), RedisTaskQueue (нужен пакет redis),
+MemoryTaskQueue (в пределах одного процесса — для локальных прогонов и проверок).
+"""
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+PENDING = 'pending'
+LEASED = 'leased'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+DEFAULT_MAX_ATTEMPTS = 3
+
+
+@dataclass
+class CrawlTask:
+    """Задание: диапазон страниц выдачи одного города"""
+    run_id: str
+    job_id: str
+    city: str
+    country: str = 'Россия'
+    category: Optional[str] = None
+    page_start: int = 1
+    page_end: int = 1
+    priority: int = 0
+    city_slug: Optional[str] = None     # slug, подтверждённый на первой странице
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    attempts: int = 0
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self), ensure_ascii=False)
+
+    @classmethod
+    def from_json(cls, data: str) -> 'CrawlTask':
+        return cls(**json.loads(data))
+
+
+@dataclass
+class TaskOutcome:
+    """Результат задания, который забирает координатор"""
+    task: CrawlTask
+    status: str
+    result: Optional[dict] = None
+    error: Optional[str] = None
+
+
+class TaskQueue:
+    """Общий интерфейс бэкендов очереди"""
+
+    def __init__(self, max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+        self.max_attempts = max_attempts
+
+    def put(self, task: CrawlTask):
+        raise NotImplementedError
+
+    def claim(self, worker_id: str, lease_seconds: float) -> Optional[CrawlTask]:
+        """Взять следующее задание в аренду (с учётом priority). None — очередь пуста."""
+        raise NotImplementedError
+
+    def extend(self, task_id: str, worker_id: str, lease_seconds: float) -> bool:
+        """Продлить аренду. False — аренда потеряна (истекла или задание уже выполнено)."""
+        raise NotImplementedError
+
+    def complete(self, task_id: str, worker_id: str, result: dict) -> bool:
+        """Сохранить результат. False — задание уже выполнено или отменено."""
+        raise NotImplementedError
+
+    def fail(self, task_id: str, worker_id: str, error: str):
+        """Ошибка выполнения: задание возвращается в очередь или помечается failed."""
+        raise NotImplementedError
+
+    def cancel_job(self, run_id: str, job_id: str):
+        """Отменить ещё не взятые задания job_id (например, набран max_results)."""
+        raise NotImplementedError
+
+    def pop_outcomes(self, run_id: str) -> List[TaskOutcome]:
+        """Забрать новые завершённые (done/failed) задания запуска — каждое ровно один раз."""
+        raise NotImplementedError
+
+    def counts(self, run_id: str) -> Dict[str, int]:
+        """Количество заданий запуска по статусам"""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class MemoryTaskQueue(TaskQueue):
+    """Очередь в памяти процесса"""
+
+    def __init__(self, max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+        super().__init__(max_attempts)
+        self._lock = threading.Lock()
+        self._tasks: Dict[str, dict] = {}
+        self._order = 0
+
+    def _requeue_expired(self, now: float):
+        for rec in self._tasks.values():
+            if rec['status'] == LEASED and rec['lease_until'] < now:
+                self._retry(rec, 'аренда истекла')
+
+    def _retry(self, rec: dict, error: str):
+        rec['task'].attempts += 1
+        rec['worker'] = None
+        rec['error'] = error
+        if rec['task'].attempts >= self.max_attempts:
+            rec['status'] = FAILED
+            rec['reported'] = False
+        else:
+            rec['status'] = PENDING
+
+    def put(self, task: CrawlTask):
+        with self._lock:
+            self._order += 1
+            self._tasks[task.id] = {
+                'task': task, 'status': PENDING, 'worker': None, 'lease_until': 0.0,
+                'order': self._order, 'result': None, 'error': None, 'reported': False,
+            }
+
+    def claim(self, worker_id: str, lease_seconds: float) -> Optional[CrawlTask]:
+        with self._lock:
+            now = time.time()
+            self._requeue_expired(now)
+            pending = [r for r in self._tasks.values() if r['status'] == PENDING]
+            if not pending:
+                return None
+            rec = min(pending, key=lambda r: (-r['task'].priority, r['order']))
+            rec.update(status=LEASED, worker=worker_id, lease_until=now + lease_seconds)
+            return CrawlTask(**asdict(rec['task']))
+
+    def extend(self, task_id: str, worker_id: str, lease_seconds: float) -> bool:
+        with self._lock:
+            rec = self._tasks.get(task_id)
+            if not rec or rec['status'] != LEASED or rec['worker'] != worker_id:
+                return False
+            rec['lease_until'] = time.time() + lease_seconds
+            return True
+
+    def complete(self, task_id: str, worker_id: str, result: dict) -> bool:
+        with self._lock:
+            rec = self._tasks.get(task_id)
+            if not rec or rec['status'] not in (PENDING, LEASED):
+                return False
+            rec.update(status=DONE, result=result, reported=False)
+            return True
+
+    def fail(self, task_id: str, worker_id: str, error: str):
+        with self._lock:
+            rec = self._tasks.get(task_id)
+            if rec and rec['status'] == LEASED and rec['worker'] == worker_id:
+                self._retry(rec, error)
+
+    def cancel_job(self, run_id: str, job_id: str):
+        with self._lock:
+            for rec in self._tasks.values():
+                t = rec['task']
+                if t.run_id == run_id and t.job_id == job_id and rec['status'] == PENDING:
+                    rec['status'] = CANCELLED
+
+    def pop_outcomes(self, run_id: str) -> List[TaskOutcome]:
+        with self._lock:
+            out = []
+            for rec in self._tasks.values():
+                if rec['task'].run_id == run_id and rec['status'] in (DONE, FAILED) and not rec['reported']:
+                    rec['reported'] = True
+                    out.append(TaskOutcome(rec['task'], rec['status'], rec['result'], rec['error']))
+            return out
+
+    def counts(self, run_id: str) -> Dict[str, int]:
+        with self._lock:
+            self._requeue_expired(time.time())
+            result: Dict[str, int] = {}
+            for rec in self._tasks.values():
+                if rec['task'].run_id == run_id:
+                    result[rec['status']] = result.get(rec['status'], 0) + 1
+            return result
+
+
+class SQLiteTaskQueue(TaskQueue):
+    """
+    Очередь в файле SQLite. Подходит для воркеров на одной машине или на общем
+    сетевом диске; каждое обращение — отдельное соединение и транзакция.
+    """
+
+    def __init__(self, path: str, max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+        super().__init__(max_attempts)
+        self.path = path
+        with self._tx() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS tasks (
+                    id TEXT PRIMARY KEY,
+                    run_id TEXT NOT NULL,
+                    job_id TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    priority INTEGER NOT NULL DEFAULT 0,
+                    status TEXT NOT NULL,
+                    worker TEXT,
+                    lease_until REAL NOT NULL DEFAULT 0,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    result TEXT,
+                    error TEXT,
+                    reported INTEGER NOT NULL DEFAULT 0,
+                    created REAL NOT NULL
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_tasks_claim ON tasks(status, priority, created)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_tasks_run ON tasks(run_id, status)')
+
+    @contextmanager
+    def _tx(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield conn
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        finally:
+            conn.close()
+
+    def _requeue_expired(self, conn, now: float):
+        conn.execute('''
+            UPDATE tasks
+            SET attempts = attempts + 1, worker = NULL, error = 'аренда истекла',
+                status = CASE WHEN attempts + 1 >= ? THEN 'failed' ELSE 'pending' END
+            WHERE status = 'leased' AND lease_until < ?
+        ''', (self.max_attempts, now))
+
+    def put(self, task: CrawlTask):
+        with self._tx() as conn:
+            conn.execute(
+                'INSERT INTO tasks (id, run_id, job_id, payload, priority, status, attempts, created) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (task.id, task.run_id, task.job_id, task.to_json(), task.priority, PENDING, task.attempts, time.time())
+            )
+
+    def claim(self, worker_id: str, lease_seconds: float) -> Optional[CrawlTask]:
+        now = time.time()
+        with self._tx() as conn:
+            self._requeue_expired(conn, now)
+            row = conn.execute(
+                "SELECT id, payload, attempts FROM tasks WHERE status = 'pending' "
+                "ORDER BY priority DESC, created LIMIT 1"
+            ).fetchone()
+            if not row:
+                return None
+            conn.execute(
+                "UPDATE tasks SET status = 'leased', worker = ?, lease_until = ? WHERE id = ?",
+                (worker_id, now + lease_seconds, row[0])
+            )
+        task = CrawlTask.from_json(row[1])
+        task.attempts = row[2]
+        return task
+
+    def extend(self, task_id: str, worker_id: str, lease_seconds: float) -> bool:
+        with self._tx() as conn:
+            cur = conn.execute(
+                "UPDATE tasks SET lease_until = ? WHERE id = ? AND worker = ? AND status = 'leased'",
+                (time.time() + lease_seconds, task_id, worker_id)
+            )
+            return cur.rowcount > 0
+
+    def complete(self, task_id: str, worker_id: str, result: dict) -> bool:
+        with self._tx() as conn:
+            cur = conn.execute(
+                "UPDATE tasks SET status = 'done', result = ?, reported = 0, worker = ? "
+                "WHERE id = ? AND status IN ('pending', 'leased')",
+                (json.dumps(result, ensure_ascii=False), worker_id, task_id)
+            )
+            return cur.rowcount > 0
+
+    def fail(self, task_id: str, worker_id: str, error: str):
+        with self._tx() as conn:
+            conn.execute('''
+                UPDATE tasks
+                SET attempts = attempts + 1, worker = NULL, error = ?, reported = 0,
+                    status = CASE WHEN attempts + 1 >= ? THEN 'failed' ELSE 'pending' END
+                WHERE id = ? AND worker = ? AND status = 'leased'
+            ''', (error[:2000], self.max_attempts, task_id, worker_id))
+
+    def cancel_job(self, run_id: str, job_id: str):
+        with self._tx() as conn:
+            conn.execute(
+                "UPDATE tasks SET status = 'cancelled' WHERE run_id = ? AND job_id = ? AND status = 'pending'",
+                (run_id, job_id)
+            )
+
+    def pop_outcomes(self, run_id: str) -> List[TaskOutcome]:
+        with self._tx() as conn:
+            rows = conn.execute(
+                "SELECT id, payload, attempts, status, result, error FROM tasks "
+                "WHERE run_id = ? AND status IN ('done', 'failed') AND reported = 0",
+                (run_id,)
+            ).fetchall()
+            conn.executemany('UPDATE tasks SET reported = 1 WHERE id = ?', [(r[0],) for r in rows])
+        out = []
+        for _, payload, attempts, status, result, error in rows:
+            task = CrawlTask.from_json(payload)
+            task.attempts = attempts
+            out.append(TaskOutcome(task, status, json.loads(result) if result else None, error))
+        return out
+
+    def counts(self, run_id: str) -> Dict[str, int]:
+        with self._tx() as conn:
+            self._requeue_expired(conn, time.time())
+            rows = conn.execute(
+                'SELECT status, COUNT(*) FROM tasks WHERE run_id = ? GROUP BY status', (run_id,)
+            ).fetchall()
+        return dict(rows)
+
+
+class RedisTaskQueue(TaskQueue):
+    """
+    Очередь в Redis (или совместимом сервере) — для воркеров на разных машинах.
+    Ключи: <prefix>:pending (zset по приоритету), <prefix>:leased (zset по сроку аренды),
+    <prefix>:task:<id> (hash), <prefix>:outcomes:<run_id> (list), <prefix>:job:<run_id>:<job_id> (set),
+    <prefix>:counts:<run_id> (hash: число заданий по статусам).
+    Смена статуса — Lua-скрипт: проверка и запись атомарны, счётчики статусов меняются вместе с ней.
+    """
+
+    _CLAIM_LUA = """
+        local p, worker, lease_until = ARGV[1], ARGV[2], ARGV[3]
+        local popped = redis.call('ZPOPMIN', p .. ':pending', 1)
+        if #popped == 0 then return false end
+        local id = popped[1]
+        local key = p .. ':task:' .. id
+        redis.call('HSET', key, 'status', 'leased', 'worker', worker)
+        redis.call('ZADD', p .. ':leased', lease_until, id)
+        local counts = p .. ':counts:' .. redis.call('HGET', key, 'run_id')
+        redis.call('HINCRBY', counts, 'pending', -1)
+        redis.call('HINCRBY', counts, 'leased', 1)
+        return {id, redis.call('HGET', key, 'payload'), redis.call('HGET', key, 'attempts')}
+    """
+
+    _EXTEND_LUA = """
+        local p, id, worker, lease_until = ARGV[1], ARGV[2], ARGV[3], ARGV[4]
+        local key = p .. ':task:' .. id
+        if redis.call('HGET', key, 'status') ~= 'leased' or redis.call('HGET', key, 'worker') ~= worker then
+            return 0
+        end
+        redis.call('ZADD', p .. ':leased', 'XX', lease_until, id)
+        return 1
+    """
+
+    _COMPLETE_LUA = """
+        local p, id, worker, result = ARGV[1], ARGV[2], ARGV[3], ARGV[4]
+        local key = p .. ':task:' .. id
+        local status = redis.call('HGET', key, 'status')
+        if status ~= 'pending' and status ~= 'leased' then return 0 end
+        redis.call('ZREM', p .. ':leased', id)
+        redis.call('ZREM', p .. ':pending', id)
+        redis.call('HSET', key, 'status', 'done', 'worker', worker, 'result', result)
+        local run_id = redis.call('HGET', key, 'run_id')
+        local counts = p .. ':counts:' .. run_id
+        redis.call('HINCRBY', counts, status, -1)
+        redis.call('HINCRBY', counts, 'done', 1)
+        redis.call('RPUSH', p .. ':outcomes:' .. run_id, id)
+        return 1
+    """
+
+    # worker = '' — любой воркер; now != '' — только если аренда истекла к этому моменту
+    _RETRY_LUA = """
+        local p, id, worker, err, max_attempts, now = ARGV[1], ARGV[2], ARGV[3], ARGV[4], tonumber(ARGV[5]), ARGV[6]
+        local key = p .. ':task:' .. id
+        if redis.call('HGET', key, 'status') ~= 'leased' then return 0 end
+        if worker ~= '' and redis.call('HGET', key, 'worker') ~= worker then return 0 end
+        if now ~= '' then
+            local lease_until = redis.call('ZSCORE', p .. ':leased', id)
+            if lease_until and tonumber(lease_until) >= tonumber(now) then return 0 end
+        end
+        redis.call('ZREM', p .. ':leased', id)
+        local run_id = redis.call('HGET', key, 'run_id')
+        local counts = p .. ':counts:' .. run_id
+        local attempts = redis.call('HINCRBY', key, 'attempts', 1)
+        redis.call('HSET', key, 'worker', '', 'error', err)
+        redis.call('HINCRBY', counts, 'leased', -1)
+        if attempts >= max_attempts then
+            redis.call('HSET', key, 'status', 'failed')
+            redis.call('HINCRBY', counts, 'failed', 1)
+            redis.call('RPUSH', p .. ':outcomes:' .. run_id, id)
+        else
+            redis.call('HSET', key, 'status', 'pending')
+            redis.call('HINCRBY', counts, 'pending', 1)
+            redis.call('ZADD', p .. ':pending', redis.call('HGET', key, 'score'), id)
+        end
+        return 1
+    """
+
+    _CANCEL_LUA = """
+        local p, run_id, job_id = ARGV[1], ARGV[2], ARGV[3]
+        local cancelled = 0
+        for _, id in ipairs(redis.call('SMEMBERS', p .. ':job:' .. run_id .. ':' .. job_id)) do
+            if redis.call('ZREM', p .. ':pending', id) == 1 then
+                redis.call('HSET', p .. ':task:' .. id, 'status', 'cancelled')
+                cancelled = cancelled + 1
+            end
+        end
+        if cancelled > 0 then
+            local counts = p .. ':counts:' .. run_id
+            redis.call('HINCRBY', counts, 'pending', -cancelled)
+            redis.call('HINCRBY', counts, 'cancelled', cancelled)
+        end
+        return cancelled
+    """
+
+    def __init__(self, url: str, prefix: str = '2gis', max_attempts: int = DEFAULT_MAX_ATTEMPTS, client=None):
+        super().__init__(max_attempts)
+        if client is None:
+            try:
+                import redis
+            except ImportError:
+                raise ValueError("Для очереди Redis установите пакет redis: pip install redis")
+            client = redis.Redis.from_url(url, decode_responses=True)
+        self.r = client
+        self.prefix = prefix
+        self._claim = client.register_script(self._CLAIM_LUA)
+        self._extend = client.register_script(self._EXTEND_LUA)
+        self._complete = client.register_script(self._COMPLETE_LUA)
+        self._retry = client.register_script(self._RETRY_LUA)
+        self._cancel = client.register_script(self._CANCEL_LUA)
+
+    def _k(self, *parts) -> str:
+        return ':'.join((self.prefix,) + tuple(str(p) for p in parts))
+
+    def _requeue_expired(self, now: float):
+        for task_id in self.r.zrangebyscore(self._k('leased'), '-inf', now):
+            self._retry(args=[self.prefix, task_id, '', 'аренда истекла', self.max_attempts, now])
+
+    def put(self, task: CrawlTask):
+        # Чем больше priority, тем меньше score; при равном — по времени постановки
+        score = -task.priority * 1e10 + time.time()
+        pipe = self.r.pipeline()
+        pipe.hset(self._k('task', task.id), mapping={
+            'payload': task.to_json(), 'run_id': task.run_id, 'job_id': task.job_id,
+            'status': PENDING, 'attempts': task.attempts, 'score': score, 'worker': '',
+        })
+        pipe.sadd(self._k('job', task.run_id, task.job_id), task.id)
+        pipe.hincrby(self._k('counts', task.run_id), PENDING, 1)
+        pipe.zadd(self._k('pending'), {task.id: score})
+        pipe.execute()
+
+    def claim(self, worker_id: str, lease_seconds: float) -> Optional[CrawlTask]:
+        now = time.time()
+        self._requeue_expired(now)
+        claimed = self._claim(args=[self.prefix, worker_id, now + lease_seconds])
+        if not claimed:
+            return None
+        _, payload, attempts = claimed
+        task = CrawlTask.from_json(payload)
+        task.attempts = int(attempts or 0)
+        return task
+
+    def extend(self, task_id: str, worker_id: str, lease_seconds: float) -> bool:
+        return bool(self._extend(args=[self.prefix, task_id, worker_id, time.time() + lease_seconds]))
+
+    def complete(self, task_id: str, worker_id: str, result: dict) -> bool:
+        return bool(self._complete(args=[self.prefix, task_id, worker_id, json.dumps(result, ensure_ascii=False)]))
+
+    def fail(self, task_id: str, worker_id: str, error: str):
+        self._retry(args=[self.prefix, task_id, worker_id, error[:2000], self.max_attempts, ''])
+
+    def cancel_job(self, run_id: str, job_id: str):
+        self._cancel(args=[self.prefix, run_id, job_id])
+
+    def pop_outcomes(self, run_id: str) -> List[TaskOutcome]:
+        out = []
+        while True:
+            task_id = self.r.lpop(self._k('outcomes', run_id))
+            if task_id is None:
+                return out
+            data = self.r.hgetall(self._k('task', task_id))
+            task = CrawlTask.from_json(data['payload'])
+            task.attempts = int(data.get('attempts') or 0)
+            out.append(TaskOutcome(
+                task, data['status'],
+                json.loads(data['result']) if data.get('result') else None,
+                data.get('error') or None,
+            ))
+
+    def counts(self, run_id: str) -> Dict[str, int]:
+        self._requeue_expired(time.time())
+        return {status: int(n) for status, n in self.r.hgetall(self._k('counts', run_id)).items() if int(n)}
+
+
+def open_queue(url: str, max_attempts: int = DEFAULT_MAX_ATTEMPTS) -> TaskQueue:
+    """
+    Очередь по адресу: путь к файлу или sqlite:///path — SQLite,
+    redis://host:port/db — Redis, memory:// — в памяти процесса.
+    """
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisTaskQueue(url, max_attempts=max_attempts)
+    if url.startswith('memory://'):
+        return MemoryTaskQueue(max_attempts=max_attempts)
+    if url.startswith('sqlite:///'):
+        url = url[len('sqlite:///'):]
+    return SQLiteTaskQueue(url, max_attempts=max_attempts)
@@ -0,0 +1,172 @@
+"""
+Сторож браузера: за сотни загрузок Chrome разрастается по памяти, замедляется и падает.
+WatchedDriver оборачивает WebDriver, считает страницы, следит за RSS дерева процессов
+Chrome и временем навигации и перезапускает браузер при превышении лимитов;
+упавшая навигация повторяется на свежем браузере.
+"""
+import logging
+import os
+import statistics
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class WatchdogLimits:
+    max_pages: Optional[int] = 150          # перезапуск после N навигаций
+    max_rss_mb: Optional[float] = 1500      # RSS chromedriver + Chrome + дочерних процессов
+    rss_every: int = 10                     # память проверяется раз в N навигаций (без psutil — обход /proc)
+    latency_factor: Optional[float] = 3.0   # средняя навигация хуже базовой во столько раз
+    latency_floor: float = 2.0              # ...и при этом не быстрее стольких секунд
+    window: int = 5                         # навигаций для базовой и текущей задержки
+
+
+def process_tree_rss(pid: int) -> Optional[int]:
+    """Суммарный RSS процесса и всех потомков в байтах (psutil или /proc); None — не удалось"""
+    try:
+        import psutil
+    except ImportError:
+        psutil = None
+    if psutil is not None:
+        try:
+            root = psutil.Process(pid)
+            procs = [root] + root.children(recursive=True)
+        except psutil.Error:
+            return None
+        total = 0
+        for p in procs:
+            try:
+                total += p.memory_info().rss
+            except psutil.Error:
+                pass
+        return total
+    if not os.path.isdir('/proc'):
+        return None
+    # Без psutil — дерево процессов по /proc/<pid>/stat (только Linux)
+    children, rss = {}, {}
+    page_size = os.sysconf('SC_PAGE_SIZE')
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat', 'rb') as f:
+                fields = f.read().rsplit(b')', 1)[1].split()
+        except OSError:
+            continue
+        children.setdefault(int(fields[1]), []).append(int(entry))
+        rss[int(entry)] = int(fields[21]) * page_size
+    if pid not in rss:
+        return None
+    total, stack = 0, [pid]
+    while stack:
+        p = stack.pop()
+        total += rss.get(p, 0)
+        stack.extend(children.get(p, ()))
+    return total
+
+
+class WatchedDriver:
+    """
+    Обёртка над WebDriver: атрибуты и методы (page_source, execute_script, quit...) проксируются
+    в текущий драйвер, ссылка на обёртку остаётся валидной после перезапуска.
+    factory — функция запуска нового драйвера.
+    """
+
+    _rss_warned = False  # предупреждение «память не измерить» — один раз на процесс
+
+    def __init__(self, factory: Callable, limits: Optional[WatchdogLimits] = None, name: str = 'driver'):
+        self._factory = factory
+        self.limits = limits or WatchdogLimits()
+        self.name = name
+        self.restarts = 0
+        self._lock = threading.RLock()
+        self._driver = factory()
+        self._reset_counters()
+
+    def _reset_counters(self):
+        self.pages = 0
+        self._baseline = None
+        self._latencies = deque(maxlen=max(1, self.limits.window))
+        self._restart_reason = None
+
+    @property
+    def driver(self):
+        return self._driver
+
+    def __getattr__(self, name):
+        if name == '_driver':
+            raise AttributeError(name)
+        return getattr(self._driver, name)
+
+    def _rss(self) -> Optional[int]:
+        service = getattr(self._driver, 'service', None)
+        process = getattr(service, 'process', None)
+        pid = getattr(process, 'pid', None)
+        rss = process_tree_rss(pid) if pid else None
+        if rss is None and not WatchedDriver._rss_warned:
+            WatchedDriver._rss_warned = True
+            logger.warning("Не удалось измерить память Chrome (нужен psutil или /proc) — "
+                           "перезапуск по памяти отключён, остаются лимиты страниц и задержки")
+        return rss
+
+    def _check(self, latency: float):
+        """Учёт навигации; при превышении лимита браузер перезапустится перед следующей"""
+        limits = self.limits
+        self.pages += 1
+        self._latencies.append(latency)
+        if self._baseline is None and len(self._latencies) == self._latencies.maxlen:
+            self._baseline = statistics.median(self._latencies)
+        if limits.max_pages and self.pages >= limits.max_pages:
+            self._restart_reason = f"{self.pages} страниц"
+            return
+        if limits.latency_factor and self._baseline and len(self._latencies) == self._latencies.maxlen:
+            current = statistics.mean(self._latencies)
+            if current > max(self._baseline * limits.latency_factor, limits.latency_floor):
+                self._restart_reason = f"навигация {current:.1f} сек (базовая {self._baseline:.1f} сек)"
+                return
+        if limits.max_rss_mb and self.pages % max(1, limits.rss_every) == 0:
+            rss = self._rss()
+            if rss and rss > limits.max_rss_mb * 1024 * 1024:
+                self._restart_reason = f"память {rss / 1024 / 1024:.0f} МБ"
+
+    def restart(self, reason: str):
+        with self._lock:
+            logger.info(f"Перезапуск браузера {self.name}: {reason}")
+            try:
+                self._driver.quit()
+            except Exception:
+                pass
+            self._driver = self._factory()
+            self.restarts += 1
+            self._reset_counters()
+
+    def navigate(self, url: str, wait: Optional[Callable] = None):
+        """
+        driver.get(url) и ожидание загрузки. Если браузер упал или завис — перезапуск
+        и одна повторная попытка той же страницы.
+        """
+        with self._lock:
+            if self._restart_reason:
+                self.restart(self._restart_reason)
+            for attempt in range(2):
+                started = time.monotonic()
+                try:
+                    self._driver.get(url)
+                    if wait:
+                        wait(self._driver)
+                except Exception as e:
+                    if attempt:
+                        raise
+                    self.restart(f"ошибка навигации на {url}: {type(e).__name__}")
+                    continue
+                self._check(time.monotonic() - started)
+                return
+
+    def quit(self):
+        with self._lock:
+            self._driver.quit()
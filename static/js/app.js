@@ -3,6 +3,7 @@
  */
 
 let statusCheckInterval = null;
+let activeExports = 0;
 
 const searchForm = document.getElementById('searchForm');
 const searchBtn = document.getElementById('searchBtn');
@@ -17,6 +18,11 @@ const progressText = document.getElementById('progressText');
 const resultsBody = document.getElementById('resultsBody');
 const resultsCount = document.getElementById('resultsCount');
 const errorMessage = document.getElementById('errorMessage');
+const exportProgress = document.getElementById('exportProgress');
+const exportFill = document.getElementById('exportFill');
+const exportText = document.getElementById('exportText');
+
+const EXPORT_POLL_MS = 700;
 
 function showError(msg) {
     errorMessage.textContent = msg;
@@ -46,42 +52,275 @@ function updateStatus(status) {
     }
 }
 
-function showResults(results) {
-    resultsCount.textContent = `${results.length} компаний`;
+/* Виртуализированная таблица результатов: в DOM только видимые строки, данные — страницами с сервера */
+
+const ROW_HEIGHT = 44;
+const OVERSCAN = 10;
+const PAGE_SIZE = 500;
+
+const resultsScroll = document.getElementById('resultsScroll');
+const filterCity = document.getElementById('filterCity');
+const filterRating = document.getElementById('filterRating');
+const filterPhone = document.getElementById('filterPhone');
+const sortHeaders = document.querySelectorAll('.results-table th[data-sort]');
+
+const table = {
+    rows: [],        // загруженные строки (уже отфильтрованные и отсортированные сервером)
+    total: 0,        // строк на сервере с текущими фильтрами; null — ещё не известно
+    overall: 0,      // всего строк без фильтров
+    query: 0,        // поколение фильтров и сортировки: ответы для старых отбрасываются
+    loading: false,
+    sortKey: null,
+    sortDir: 1,
+    renderQueued: false,
+    pool: [],        // переиспользуемые <tr>
+};
+
+const topSpacer = createSpacer();
+const bottomSpacer = createSpacer();
+
+function createSpacer() {
+    const tr = document.createElement('tr');
+    tr.className = 'spacer-row';
+    const td = document.createElement('td');
+    td.colSpan = 6;
+    tr.appendChild(td);
+    return tr;
+}
+
+function naValue(v) {
+    return v === undefined || v === null || v === 'N/A' || v === '' ? null : v;
+}
+
+function normalizeRow(r) {
+    const rating = parseFloat(naValue(r['Рейтинг']));
+    const votes = parseInt(naValue(r['Количество голосов']), 10);
+    return {
+        name: naValue(r['Название компании']) || '—',
+        city: naValue(r['Город']) || '—',
+        phone: naValue(r['Телефон']),
+        info: naValue(r['Информация о компании']) || '—',
+        rating: Number.isFinite(rating) ? rating : null,
+        votes: Number.isFinite(votes) ? votes : null,
+    };
+}
+
+function filtersActive() {
+    return Boolean(filterCity.value || filterRating.value || filterPhone.checked);
+}
+
+/**
+ * Фильтры и сортировка применяются на сервере: клиент не выкачивает всю выборку ради короткого
+ * списка, а сортировка охватывает все строки, а не только загруженные
+ */
+function filterParams() {
+    const params = new URLSearchParams();
+    if (filterCity.value) params.set('city', filterCity.value);
+    if (filterRating.value) params.set('min_rating', filterRating.value);
+    if (filterPhone.checked) params.set('has_phone', '1');
+    if (table.sortKey) params.set('sort', (table.sortDir < 0 ? '-' : '') + table.sortKey);
+    return params;
+}
+
+function updateResultsCount() {
+    const loaded = table.rows.length;
+    if (filtersActive()) {
+        resultsCount.textContent = table.total === null
+            ? `Фильтрация... (всего ${table.overall})`
+            : `${table.total} из ${table.overall} компаний`;
+    } else if (loaded < table.total) {
+        resultsCount.textContent = `${table.total} компаний (загружено ${loaded})`;
+    } else {
+        resultsCount.textContent = `${table.total} компаний`;
+    }
+}
+
+function updateCityFilter(cities) {
+    if (filterCity.options.length - 1 === cities.length) return;
+    const selected = filterCity.value;
+    filterCity.length = 1;
+    cities.forEach(city => filterCity.add(new Option(city, city)));
+    filterCity.value = selected;
+}
+
+function createRow() {
+    const tr = document.createElement('tr');
+    for (let i = 0; i < 6; i++) tr.appendChild(document.createElement('td'));
+    tr.firstChild.appendChild(document.createElement('strong'));
+    return tr;
+}
+
+function fillRow(tr, row) {
+    const cells = tr.children;
+    cells[0].firstChild.textContent = row.name;
+    cells[1].textContent = row.city;
+    cells[2].textContent = row.phone || '—';
+    cells[3].textContent = row.info;
+    cells[4].textContent = row.rating ?? '—';
+    cells[5].textContent = row.votes ?? '—';
+    cells[3].title = row.info;
+}
+
+function scheduleRender() {
+    if (table.renderQueued) return;
+    table.renderQueued = true;
+    requestAnimationFrame(renderRows);
+}
+
+function renderRows() {
+    table.renderQueued = false;
+    const count = table.rows.length;
+    const scrollTop = resultsScroll.scrollTop;
+    const height = resultsScroll.clientHeight || ROW_HEIGHT * 12;
+    const start = Math.max(0, Math.floor(scrollTop / ROW_HEIGHT) - OVERSCAN);
+    const end = Math.min(count, Math.ceil((scrollTop + height) / ROW_HEIGHT) + OVERSCAN);
+    const needed = Math.max(0, end - start);
+
+    if (!topSpacer.isConnected) {
+        resultsBody.append(topSpacer, bottomSpacer);
+    }
+    topSpacer.style.height = `${start * ROW_HEIGHT}px`;
+    bottomSpacer.style.height = `${(count - end) * ROW_HEIGHT}px`;
+
+    while (table.pool.length < needed) table.pool.push(createRow());
+    for (let i = 0; i < table.pool.length; i++) {
+        const tr = table.pool[i];
+        if (i < needed) {
+            fillRow(tr, table.rows[start + i]);
+            if (!tr.isConnected) resultsBody.insertBefore(tr, bottomSpacer);
+        } else if (tr.isConnected) {
+            tr.remove();
+        }
+    }
+
+    // Подгрузка следующей страницы, когда прокрутка подходит к концу загруженного
+    if (end + OVERSCAN >= count) loadMoreResults();
+}
+
+async function loadMoreResults() {
+    if (table.loading || (table.total !== null && table.rows.length >= table.total)) return;
+    const query = table.query;
+    const params = filterParams();
+    params.set('offset', table.rows.length);
+    params.set('limit', PAGE_SIZE);
+    table.loading = true;
+    try {
+        const res = await fetch(`/api/results?${params}`);
+        const data = await safeJson(res);
+        if (query !== table.query) return;  // фильтры сменились — loading уже сброшен reloadResults
+        const results = data.results || [];
+        results.forEach(r => table.rows.push(normalizeRow(r)));
+        table.total = results.length ? (data.total ?? table.rows.length) : table.rows.length;
+        if (data.cities) updateCityFilter(data.cities);
+        table.loading = false;
+        updateResultsCount();
+        scheduleRender();
+    } catch (e) {
+        if (query === table.query) table.loading = false;
+        console.warn('Results page load failed', e);
+    }
+}
+
+function reloadResults() {
+    table.query++;
+    table.loading = false;
+    table.rows = [];
+    table.total = filtersActive() ? null : table.overall;
+    resultsScroll.scrollTop = 0;
+    updateResultsCount();
+    scheduleRender();
+}
+
+function resetResultsTable() {
+    table.rows = [];
+    table.total = 0;
+    table.overall = 0;
+    table.query++;
+    table.loading = false;
+    table.sortKey = null;
+    table.sortDir = 1;
+    filterCity.length = 1;
+    filterRating.value = '';
+    filterPhone.checked = false;
+    sortHeaders.forEach(th => th.classList.remove('sorted-asc', 'sorted-desc'));
     resultsBody.innerHTML = '';
-    results.forEach(r => {
-        const tr = document.createElement('tr');
-        tr.innerHTML = `
-            <td><strong>${escapeHtml(r['Название компании'] || '—')}</strong></td>
-            <td>${escapeHtml(r['Город'] !== 'N/A' ? r['Город'] : '—')}</td>
-            <td>${escapeHtml(r['Телефон'] !== 'N/A' ? r['Телефон'] : '—')}</td>
-            <td>${escapeHtml(r['Информация о компании'] !== 'N/A' ? r['Информация о компании'] : '—')}</td>
-            <td>${r['Рейтинг'] !== 'N/A' ? r['Рейтинг'] : '—'}</td>
-            <td>${r['Количество голосов'] !== 'N/A' ? r['Количество голосов'] : '—'}</td>
-        `;
-        resultsBody.appendChild(tr);
-    });
+    resultsScroll.scrollTop = 0;
+}
+
+function showResults(total) {
+    resetResultsTable();
+    table.total = total;
+    table.overall = total;
     resultsPanel.hidden = false;
     resetBtn.style.display = 'inline-block';
+    updateResultsCount();
+    scheduleRender();
 }
 
-function escapeHtml(text) {
-    const div = document.createElement('div');
-    div.textContent = text;
-    return div.innerHTML;
+resultsScroll.addEventListener('scroll', scheduleRender, { passive: true });
+
+[filterCity, filterRating, filterPhone].forEach(el => el.addEventListener('change', reloadResults));
+
+sortHeaders.forEach(th => th.addEventListener('click', () => {
+    const key = th.dataset.sort;
+    table.sortDir = table.sortKey === key ? -table.sortDir : 1;
+    table.sortKey = key;
+    sortHeaders.forEach(h => h.classList.remove('sorted-asc', 'sorted-desc'));
+    th.classList.add(table.sortDir > 0 ? 'sorted-asc' : 'sorted-desc');
+    reloadResults();
+}));
+
+function updateExportProgress(job) {
+    const pct = job.total > 0 ? Math.min((job.rows_written / job.total) * 100, 100) : 0;
+    exportFill.style.width = pct + '%';
+    exportText.textContent = job.status === 'saving'
+        ? `Сохранение файла (${job.total} строк)...`
+        : `Экспорт: ${job.rows_written} / ${job.total}`;
+}
+
+/** Фоновый экспорт: свой опрос прогресса, статус поиска опрашивается независимо */
+async function startExport() {
+    const res = await fetch('/api/exports', { method: 'POST', headers: { 'Content-Type': 'application/json' } });
+    const job = await safeJson(res);
+    if (!res.ok) throw new Error(job.error || 'Ошибка экспорта');
+
+    activeExports++;
+    exportProgress.hidden = false;
+    updateExportProgress(job);
+    try {
+        return await new Promise((resolve, reject) => {
+            const poll = async () => {
+                try {
+                    const r = await fetch(`/api/exports/${job.id}`);
+                    const state = await safeJson(r);
+                    if (!r.ok) throw new Error(state.error || 'Ошибка экспорта');
+                    updateExportProgress(state);
+                    if (state.status === 'done') {
+                        const a = document.createElement('a');
+                        a.href = `/api/exports/${job.id}/file`;
+                        a.download = state.filename;
+                        a.click();
+                        resolve(state);
+                    } else if (state.status === 'error') {
+                        reject(new Error(state.error || 'Ошибка экспорта'));
+                    } else {
+                        setTimeout(poll, EXPORT_POLL_MS);
+                    }
+                } catch (e) {
+                    reject(e);
+                }
+            };
+            setTimeout(poll, EXPORT_POLL_MS);
+        });
+    } finally {
+        activeExports--;
+        if (!activeExports) exportProgress.hidden = true;
+    }
 }
 
 async function autoDownloadExcel() {
     try {
-        const res = await fetch('/api/download', { method: 'POST', headers: { 'Content-Type': 'application/json' } });
-        if (!res.ok) return;
-        const blob = await res.blob();
-        const url = URL.createObjectURL(blob);
-        const a = document.createElement('a');
-        a.href = url;
-        a.download = '2gis_results.xlsx';
-        a.click();
-        URL.revokeObjectURL(url);
+        await startExport();
     } catch (e) {
         console.warn('Auto-download failed', e);
     }
@@ -107,8 +346,8 @@ function startStatusCheck() {
                 statusCheckInterval = null;
                 setSearching(false);
                 if (status.error) showError(status.error);
-                else if (status.results?.length) {
-                    showResults(status.results);
+                else if (status.results_count) {
+                    showResults(status.results_count);
                     setTimeout(autoDownloadExcel, 800);
                 }
             }
@@ -172,24 +411,16 @@ resetBtn.addEventListener('click', async () => {
     document.getElementById('city').value = '';
     document.getElementById('category').value = '';
     document.getElementById('maxResults').value = '';
-    resultsBody.innerHTML = '';
+    resetResultsTable();
 });
 
 downloadBtn.addEventListener('click', async () => {
+    downloadBtn.disabled = true;
     try {
-        const res = await fetch('/api/download', { method: 'POST', headers: { 'Content-Type': 'application/json' } });
-        if (!res.ok) {
-            const data = await safeJson(res).catch(() => ({}));
-            throw new Error(data.error || 'Ошибка');
-        }
-        const blob = await res.blob();
-        const url = URL.createObjectURL(blob);
-        const a = document.createElement('a');
-        a.href = url;
-        a.download = '2gis_results.xlsx';
-        a.click();
-        URL.revokeObjectURL(url);
+        await startExport();
     } catch (err) {
         showError('Ошибка скачивания: ' + err.message);
+    } finally {
+        downloadBtn.disabled = false;
     }
 });
@@ -8,9 +8,13 @@ import threading
 from flask import Flask, render_template, request, jsonify, send_file, Response
 from flask_cors import CORS
 
-from src.scraper import TwoGISScraper
-from src.excel_exporter import ExcelExporter
+from src import create_scraper
 from src.config import CITIES_BY_COUNTRY
+from src.card_cache import CardCache
+from src.cities import CITY_REGISTRY
+from src.dedup import FirmIndex
+from src.export_jobs import DONE, ExportManager
+from src.result_store import ResultStore
 
 logging.basicConfig(
     level=logging.INFO,
@@ -40,15 +44,25 @@ search_status = {
     'progress': 0,
     'total': 0,
     'current': '',
-    'results': [],
     'error': None
 }
 
+# Результаты текущего поиска: только на диске (SQLite), в памяти строки не держатся — /api/results читает их страницами
+result_store = None
+
+# Кэш разобранных карточек — общий для всех поисков сессии сервера (соседние категории, повторы)
+card_cache = CardCache()
+
+# Фоновые экспорты в Excel (не занимают поток запроса)
+export_manager = ExportManager()
+
 # Блокировка для потокобезопасности
 status_lock = threading.Lock()
 
+RESULTS_PAGE_LIMIT = 1000
+
 
-def update_status(progress=0, total=0, current='', results=None, error=None, is_running=False):
+def update_status(progress=0, total=0, current='', error=None, is_running=False):
     """Обновление статуса поиска"""
     with status_lock:
         search_status['progress'] = progress
@@ -56,8 +70,20 @@ def update_status(progress=0, total=0, current='', results=None, error=None, is_
         search_status['current'] = current
         search_status['is_running'] = is_running
         search_status['error'] = error
-        if results is not None:
-            search_status['results'] = results
+
+
+def _replace_result_store(store=None):
+    """Заменить хранилище результатов (старое закрывается и удаляется с диска — после идущих экспортов)"""
+    global result_store
+    with status_lock:
+        old, result_store = result_store, store
+    if old is not None:
+        old.close()
+
+
+def _current_store():
+    with status_lock:
+        return result_store
 
 
 @app.route('/')
@@ -92,12 +118,14 @@ def search_companies():
         search_status['progress'] = 0
         search_status['total'] = 0
         search_status['current'] = ''
-        search_status['results'] = []
         search_status['error'] = None
 
+    store = ResultStore()
+    _replace_result_store(store)
+
     thread = threading.Thread(
         target=run_search,
-        args=(country, city, category, max_results, whole_country)
+        args=(country, city, category, max_results, whole_country, store)
     )
     thread.daemon = True
     thread.start()
@@ -105,75 +133,75 @@ def search_companies():
     return jsonify({'message': 'Поиск запущен', 'status': 'started'})
 
 
-def run_search(country, city, category, max_results, whole_country=False):
-    """Выполнение поиска в отдельном потоке"""
+def run_search(country, city, category, max_results, whole_country=False, store=None):
+    """Выполнение поиска в отдельном потоке. Компании пишутся в store по мере поступления."""
     global search_status
 
     def progress_callback(current, total, message):
         update_status(progress=current, total=total, current=message, is_running=True)
 
+    if store is None:
+        store = ResultStore()
+        _replace_result_store(store)
+
     try:
         update_status(is_running=True, current='Инициализация поиска...', progress=0, total=0)
 
-        with TwoGISScraper(headless=True) as scraper:
-            all_companies = []
-            seen_urls = set()
+        with create_scraper(headless=True, card_cache=card_cache) as scraper:
+            firm_index = FirmIndex()
 
             if whole_country:
-                cities = CITIES_BY_COUNTRY.get(country, [])
+                # Крупные города первыми — max_results набирается за меньшее число загрузок
+                cities = [info.name for info in CITY_REGISTRY.cities_by_volume(country)]
                 if not cities:
                     update_status(is_running=False, error=f'Нет городов для страны: {country}')
                     return
                 total_cities = len(cities)
                 for idx, c in enumerate(cities, 1):
-                    if max_results and len(all_companies) >= max_results:
+                    if max_results and len(store) >= max_results:
                         break
-                    city_max = (max_results - len(all_companies)) if max_results else None
+                    city_max = (max_results - len(store)) if max_results else None
                     update_status(
-                        progress=len(all_companies),
+                        progress=len(store),
                         total=max_results or 0,
                         current=f'Город {idx}/{total_cities}: {c}',
                         is_running=True
                     )
-                    companies = scraper.search_companies(
+                    scraper.search_companies(
                         city=c,
                         category=category if category else None,
                         max_results=city_max,
                         progress_callback=progress_callback,
-                        country=country
+                        country=country,
+                        firm_index=firm_index,
+                        result_callback=store.add
                     )
-                    for comp in companies:
-                        if comp.url and comp.url not in seen_urls:
-                            seen_urls.add(comp.url)
-                            all_companies.append(comp)
-                companies = all_companies
             else:
-                companies = scraper.search_companies(
+                scraper.search_companies(
                     city=city,
                     category=category if category else None,
                     max_results=max_results,
                     progress_callback=progress_callback,
-                    country=country
+                    country=country,
+                    firm_index=firm_index,
+                    result_callback=store.add
                 )
-                for comp in companies:
-                    comp.city = city
 
-            if not companies:
+            found = len(store)
+            if not found:
                 update_status(
                     is_running=False,
                     error='Компании не найдены. Проверьте параметры поиска.'
                 )
                 return
 
-            results = [c.to_dict() for c in companies]
             update_status(
-                progress=len(results),
-                total=len(results),
-                current=f'Завершено! Найдено {len(results)} компаний',
-                results=results,
+                progress=found,
+                total=found,
+                current=f'Завершено! Найдено {found} компаний',
                 is_running=False
             )
-            logger.info(f"Найдено компаний: {len(results)}")
+            logger.info(f"Найдено компаний: {found}")
 
     except Exception as e:
         logger.error(f"Ошибка при поиске: {str(e)}", exc_info=True)
@@ -182,54 +210,75 @@ def run_search(country, city, category, max_results, whole_country=False):
 
 @app.route('/api/status', methods=['GET'])
 def get_status():
-    """Получение статуса поиска"""
-    with status_lock:
-        return jsonify(search_status.copy())
-
-
-@app.route('/api/download', methods=['POST'])
-def download_excel():
-    """Скачивание результатов в Excel"""
-    global search_status
-    
+    """Получение статуса поиска (сами строки — постранично через /api/results)"""
     with status_lock:
-        results = search_status.get('results', [])
-    
-    if not results:
+        status = search_status.copy()
+        store = result_store
+    status['results_count'] = len(store) if store else 0
+    return jsonify(status)
+
+
+@app.route('/api/results', methods=['GET'])
+def get_results():
+    """Постраничное чтение результатов: ?offset=&limit=&city=&min_rating=&has_phone=1&sort=-rating"""
+    offset = request.args.get('offset', default=0, type=int)
+    limit = min(request.args.get('limit', default=100, type=int), RESULTS_PAGE_LIMIT)
+    filters = {
+        'city': (request.args.get('city') or '').strip() or None,
+        'min_rating': request.args.get('min_rating', type=float),
+        'has_phone': request.args.get('has_phone') == '1',
+    }
+    sort = request.args.get('sort') or None
+
+    store = _current_store()
+    if store is None:
+        return jsonify({'total': 0, 'offset': offset, 'limit': limit, 'results': [], 'cities': []})
+    return jsonify({
+        'total': store.count(**filters),
+        'offset': offset,
+        'limit': limit,
+        'results': [c.to_dict() for c in store.page(offset, limit, sort=sort, **filters)],
+        'cities': store.cities(),
+    })
+
+
+@app.route('/api/exports', methods=['POST'])
+def create_export():
+    """Запуск фонового экспорта текущих результатов; прогресс — GET /api/exports/<id>"""
+    store = _current_store()
+    if store is None or not len(store):
         return jsonify({'error': 'Нет результатов для экспорта'}), 400
-    
     try:
-        # Создание объектов Company из словарей
-        from src.models import Company
-        companies = []
-        for result in results:
-            company = Company(
-                name=result.get('Название компании', ''),
-                phone=result.get('Телефон', '') if result.get('Телефон') != 'N/A' else None,
-                address=result.get('Адрес', '') if result.get('Адрес') != 'N/A' else None,
-                rating=result.get('Рейтинг') if result.get('Рейтинг') != 'N/A' else None,
-                voters_count=result.get('Количество голосов') if result.get('Количество голосов') != 'N/A' else None,
-                info=result.get('Информация о компании', '') if result.get('Информация о компании') != 'N/A' else None,
-                url=result.get('Ссылка', '') if result.get('Ссылка') != 'N/A' else None,
-                city=result.get('Город', '') if result.get('Город') != 'N/A' else None
-            )
-            companies.append(company)
-        
-        # Экспорт в Excel
-        exporter = ExcelExporter()
-        filename = '2gis_results.xlsx'
-        filepath = exporter.export_to_excel(companies, filename)
-        
-        return send_file(
-            filepath,
-            as_attachment=True,
-            download_name=filename,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
-        
-    except Exception as e:
-        logger.error(f"Ошибка при экспорте: {str(e)}", exc_info=True)
-        return jsonify({'error': f'Ошибка экспорта: {str(e)}'}), 500
+        job = export_manager.submit(store)
+    except RuntimeError:
+        # Хранилище закрыли между проверкой и постановкой (новый поиск или сброс)
+        return jsonify({'error': 'Нет результатов для экспорта'}), 400
+    return jsonify(job.to_dict()), 202
+
+
+@app.route('/api/exports/<job_id>', methods=['GET'])
+def get_export(job_id):
+    """Статус экспорта: status, rows_written из total"""
+    job = export_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Экспорт не найден'}), 404
+    return jsonify(job.to_dict())
+
+
+@app.route('/api/exports/<job_id>/file', methods=['GET'])
+def get_export_file(job_id):
+    """Готовый файл экспорта"""
+    job = export_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Экспорт не найден'}), 404
+    if job.status != DONE:
+        return jsonify({'error': 'Экспорт ещё не готов', 'status': job.status}), 409
+    return send_file(
+        job.filepath,
+        as_attachment=True,
+        download_name=job.filename,
+        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    )
 
 
 @app.route('/api/reset', methods=['POST'])
@@ -237,14 +286,16 @@ def reset_status():
     """Сброс статуса поиска"""
     global search_status
     with status_lock:
+        if search_status['is_running']:
+            return jsonify({'error': 'Поиск уже выполняется'}), 400
         search_status = {
             'is_running': False,
             'progress': 0,
             'total': 0,
             'current': '',
-            'results': [],
             'error': None
         }
+    _replace_result_store(None)
     return jsonify({'message': 'Статус сброшен'})
 
 
@@ -286,4 +337,7 @@ if __name__ == '__main__':
     print("Браузер откроется автоматически. Для остановки: Ctrl+C\n")
     print("="*60 + "\n")
 
-    app.run(debug=False, host='0.0.0.0', port=port, use_reloader=False)
+    try:
+        app.run(debug=False, host='0.0.0.0', port=port, use_reloader=False, threaded=True)
+    finally:
+        export_manager.shutdown()